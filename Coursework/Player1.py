@@ -1,83 +1,378 @@
+import time
+from evaluation import WindowEvaluator, BatchEvaluator
+from opening_book import OpeningBook
+from solver import Solver
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside an iterative deepening search when the deadline or the evaluation budget runs out.
+    """
+
+
 class Player1:
-    def __init__(self, computational_budget):
+    def __init__(self, computational_budget, make_unmake=True, tt_size=1 << 16, iterative_deepening=False, time_limit=None,
+                 incremental_eval=True, endgame_cells=16, opening_book=None, hooks=None, batch_eval=False):
         """
         Initialize Player 1 with a computational budget.
         :param computational_budget: Maximum number of evaluations allowed.
+            With iterative deepening this may be float('inf') to search only to the time limit.
+        :param make_unmake: Search in place on one state with DoMove/UndoMove instead of cloning every child.
+        :param tt_size: Number of transposition table slots, 0 disables the table.
+        :param iterative_deepening: Search depth 1, 2, 3... until a limit is hit and play the best move
+            of the last completed depth, ordering moves by principal variation, killer moves and history.
+        :param time_limit: Seconds per move for iterative deepening, None to stop on the budget only.
+        :param incremental_eval: Score leaves with a WindowEvaluator kept up to date by DoMove/UndoMove
+            instead of rescanning the board in EvaluateState.
+        :param endgame_cells: With this many empty cells or fewer the position is solved exactly
+            instead of searched, 0 disables the solver.
+        :param opening_book: Path of a book built by opening_book.py, consulted before searching.
+        :param hooks: Callables called as hook(player, move_stats) after every move, for profiling.
+        :param batch_eval: With incremental_eval, score all children of a node on the last ply in one
+            NumPy call with a BatchEvaluator instead of playing and scoring each of them (needs numpy).
         """
         self.computational_budget = computational_budget
+        self.make_unmake = make_unmake
         self.evaluations = 0  # Track the number of evaluations performed
+        self.nodes = 0  # Positions visited by Minimax during the last move
+        self.cutoffs = 0  # Alpha-beta and transposition table cut-offs during the last move
+        self.move_stats = {}  # Statistics of the last move, see choose_move
+        self.hooks = list(hooks) if hooks is not None else []
+        self.transposition_table = TranspositionTable(tt_size) if tt_size > 0 else None
+        self.iterative_deepening = iterative_deepening
+        self.time_limit = time_limit
+        self.incremental_eval = incremental_eval
+        self.batch_eval = batch_eval
+        self.batch_evaluator = None  # BatchEvaluator for the board size and connect length of the current search
+        self.solver = Solver(max_empty=endgame_cells) if endgame_cells > 0 else None
+        self.source = None  # How the last move was chosen
+        self.endgame_result = None  # (result, distance) proven by the solver for the last move
+        self.opening_book = OpeningBook.Open(opening_book) if opening_book is not None else None
+        self.deadline = None
+        self.depthReached = 0  # Depth of the last search counting the root move, the last completed one with iterative deepening
+        self.searchDepth = 0  # Depth of the current iteration, ply = searchDepth - depth
+        self.pv = []  # Principal variation of the last completed iteration
+        self.pvTable = []
+        self.killers = {}  # ply -> the two most recent moves that caused a cut-off there
+        self.history = {1: [], 2: []}  # player -> cut-off score per column
+
+    def SearchChild(self, state, move, depth, alpha, beta, maximizingPlayer):
+        """
+        Plays move on state (or on a clone of it) and returns the Minimax score of the resulting position.
+        """
+        if self.make_unmake:
+            state.DoMove(move)
+            score = self.Minimax(state, depth, alpha, beta, maximizingPlayer)
+            state.UndoMove()
+            return score
+        newState = state.Clone()
+        newState.DoMove(move)
+        return self.Minimax(newState, depth, alpha, beta, maximizingPlayer)
 
     def Minimax(self, state, depth, alpha, beta, maximizingPlayer):
         """
 
         """
+        self.nodes += 1
+        if self.iterative_deepening:
+            self.CheckLimits()
+            ply = self.searchDepth - depth
+            self.pvTable[ply] = []
+
         if depth == 0 or state.IsGameOver() or self.evaluations >= self.computational_budget:
             self.evaluations += 1
             return self.EvaluateState(state)
 
         moves = state.GetMoves()
-        # Sort moves to prioritize central positions
-        moves = sorted(moves, key=lambda move: -abs(move - state.width // 2))
+        if self.iterative_deepening:
+            moves = self.OrderMoves(state, moves, ply)
+        else:
+            # Sort moves to prioritize central positions
+            moves = sorted(moves, key=lambda move: -abs(move - state.width // 2))
+
+        # Transposition table: reuse the result of an earlier search of this position or, on odd widths, its mirror image
+        alphaOrig, betaOrig = alpha, beta
+        if self.transposition_table is not None:
+            key, mirrored = state.CanonicalHash()
+            entry = self.transposition_table.Probe(key)
+            if entry is not None:
+                ttDepth, flag, ttScore, ttMove = entry
+                if ttDepth >= depth:
+                    if flag == EXACT:
+                        self.transposition_table.stats["cutoffs"] += 1
+                        self.cutoffs += 1
+                        return ttScore
+                    elif flag == LOWER:
+                        alpha = max(alpha, ttScore)
+                    else:
+                        beta = min(beta, ttScore)
+                    if beta <= alpha:
+                        self.transposition_table.stats["cutoffs"] += 1
+                        self.cutoffs += 1
+                        return ttScore
+                if mirrored:
+                    ttMove = state.width - 1 - ttMove
+                if ttMove in moves:  # Search the previous best move first
+                    moves.remove(ttMove)
+                    moves.insert(0, ttMove)
 
+        # Last ply: score every child at once instead of one Minimax call each
+        leafScores = None
+        if depth == 1 and self.batch_evaluator is not None:
+            leafScores = dict(zip(moves, self.batch_evaluator.EvaluateChildren(state, moves).tolist()))
+
+        bestMove = moves[0]
         if maximizingPlayer:
             bestScore = -float('inf')
             for move in moves:
                 if self.evaluations >= self.computational_budget:
                     break
-                newState = state.Clone()
-                newState.DoMove(move)
-                score = self.Minimax(newState, depth - 1, alpha, beta, False)
-                bestScore = max(bestScore, score)
+                if leafScores is not None:
+                    score = self.LeafScore(leafScores, move)
+                else:
+                    score = self.SearchChild(state, move, depth - 1, alpha, beta, False)
+                if score > bestScore:
+                    bestScore = score
+                    bestMove = move
+                    if self.iterative_deepening:
+                        self.pvTable[ply] = [move] + self.pvTable[ply + 1]
                 alpha = max(alpha, score)
                 if beta <= alpha:  # Beta cut-off
+                    self.cutoffs += 1
+                    if self.iterative_deepening:
+                        self.RecordCutoff(state, move, depth, ply)
                     break
-            return bestScore
         else:
             bestScore = float('inf')
             for move in moves:
                 if self.evaluations >= self.computational_budget:
                     break
-                newState = state.Clone()
-                newState.DoMove(move)
-                score = self.Minimax(newState, depth - 1, alpha, beta, True)
-                bestScore = min(bestScore, score)
+                if leafScores is not None:
+                    score = self.LeafScore(leafScores, move)
+                else:
+                    score = self.SearchChild(state, move, depth - 1, alpha, beta, True)
+                if score < bestScore:
+                    bestScore = score
+                    bestMove = move
+                    if self.iterative_deepening:
+                        self.pvTable[ply] = [move] + self.pvTable[ply + 1]
                 beta = min(beta, score)
                 if beta <= alpha:  # Alpha cut-off
+                    self.cutoffs += 1
+                    if self.iterative_deepening:
+                        self.RecordCutoff(state, move, depth, ply)
                     break
-            return bestScore
+
+        # Only store results of searches that the budget did not cut short
+        if self.transposition_table is not None and self.evaluations < self.computational_budget:
+            if bestScore <= alphaOrig:
+                flag = UPPER
+            elif bestScore >= betaOrig:
+                flag = LOWER
+            else:
+                flag = EXACT
+            key, mirrored = state.CanonicalHash()
+            self.transposition_table.Store(key, depth, flag, bestScore, state.width - 1 - bestMove if mirrored else bestMove)
+        return bestScore
+
+    def LeafScore(self, leafScores, move):
+        """
+        Takes the place of the Minimax call on a child whose score is in leafScores, with the same bookkeeping.
+        """
+        self.nodes += 1
+        if self.iterative_deepening:
+            self.CheckLimits()
+            self.pvTable[self.searchDepth] = []
+        self.evaluations += 1
+        return leafScores[move]
+
+    def Reset(self):
+        """
+        Forgets everything kept from earlier moves so the player can start a new game.
+        """
+        if self.transposition_table is not None:
+            self.transposition_table = TranspositionTable(self.transposition_table.size)
+        if self.solver is not None:
+            self.solver.table = {}
+        self.pv = []
+        self.endgame_result = None
 
     def choose_move(self, state):
+        """
+        Returns the move to play in state. Statistics of the decision are left in self.move_stats:
+        source ("book", "solver", "block" or "search"), nodes visited by Minimax, leaves evaluated,
+        cut-offs, depth reached and time in seconds. Every hook is then called with them.
+        """
+        start_time = time.perf_counter()
+        self.nodes = 0
+        self.cutoffs = 0
+        self.depthReached = 0
+        move = self.SelectMove(state)
+        self.move_stats = {
+            "source": self.source,
+            "nodes": self.nodes,
+            "leaves": self.evaluations,
+            "cutoffs": self.cutoffs,
+            "depth": self.depthReached,
+            "time": time.perf_counter() - start_time,
+        }
+        for hook in self.hooks:
+            hook(self, self.move_stats)
+        return move
+
+    def SelectMove(self, state):
         bestMove = None
         bestScore = -float('inf')
         alpha = -float('inf')
         beta = float('inf')
 
         self.evaluations = 0  # Reset evaluation counter
+        if self.transposition_table is not None:
+            self.transposition_table.NewSearch()
 
-        # Determine dynamic depth based on computational budget
-        depth = self.calculate_depth(self.computational_budget)
+        if self.opening_book is not None:
+            entry = self.opening_book.Lookup(state)
+            if entry is not None:
+                self.source = "book"
+                return entry[0]
+
+        # Exact endgame: play the proven best move once few enough cells are left
+        self.endgame_result = None
+        if self.solver is not None and self.solver.CanSolve(state):
+            move, result, distance = self.solver.BestMove(state)
+            self.endgame_result = (result, distance)
+            self.source = "solver"
+            return move
+
+        if self.make_unmake or self.incremental_eval:
+            state = state.Clone()  # With make/unmake the only copy made, the search then works in place on it
+        if self.incremental_eval:
+            state.evaluator = WindowEvaluator.FromState(state)
+            evaluator = self.batch_evaluator
+            if self.batch_eval and (evaluator is None or (evaluator.width, evaluator.height, evaluator.connect)
+                                    != (state.width, state.height, state.connect)):
+                self.batch_evaluator = BatchEvaluator(state.width, state.height, state.connect)
 
         # Defensive move priority
         for move in state.GetMoves():
-            new_state = state.Clone()
+            new_state = state.Clone() if not self.make_unmake else state
             new_state.DoMove(move)
-            if new_state.DoesMoveWin(move, 0):  # Prevent Player 2's win
+            blocks = new_state.DoesMoveWin(move, 0)
+            if self.make_unmake:
+                state.UndoMove()
+            if blocks:  # Prevent Player 2's win
+                self.source = "block"
                 return move  # Immediately block the threat
 
-        # Evaluate moves
+        self.source = "search"
+        if self.iterative_deepening:
+            return self.IterativeDeepening(state)
+
+        # Determine dynamic depth based on computational budget
+        depth = self.calculate_depth(self.computational_budget)
+        self.depthReached = depth + 1  # Counting the root move
+
+        # Evaluate moves. Scores are from Player 1's point of view, as Player 2 we look for the lowest
+        toMove = 3 - state.playerJustMoved
+        sign = 1 if toMove == 1 else -1
         for move in sorted(state.GetMoves(), key=lambda x: abs(x - state.width // 2)):
             if self.evaluations >= self.computational_budget:
                 break
-            newState = state.Clone()
-            newState.DoMove(move)
-            score = self.Minimax(newState, depth=depth, alpha=alpha, beta=beta, maximizingPlayer=False)
-            if score > bestScore:
-                bestScore = score
+            score = self.SearchChild(state, move, depth=depth, alpha=alpha, beta=beta, maximizingPlayer=(toMove == 2))
+            if sign * score > bestScore:
+                bestScore = sign * score
                 bestMove = move
-            alpha = max(alpha, bestScore)
+            if toMove == 1:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
 
         return bestMove
 
+    def IterativeDeepening(self, state):
+        """
+        Searches to depth 1, 2, 3... until the time limit or evaluation budget runs out.
+        An unfinished iteration is thrown away, so the move returned always comes from a complete search.
+        """
+        self.deadline = time.perf_counter() + self.time_limit if self.time_limit is not None else None
+        self.killers = {}
+        self.history = {1: [0] * state.width, 2: [0] * state.width}
+        self.pv = []
+        self.depthReached = 0
+
+        moves = state.GetMoves()
+        bestMove = min(moves, key=lambda x: abs(x - state.width // 2))  # Fallback if depth 1 does not finish
+        emptyCells = sum(col.count(0) for col in state.board)
+        for depth in range(1, emptyCells + 1):
+            self.searchDepth = depth
+            self.pvTable = [[] for _ in range(depth + 2)]
+            try:
+                move, pv = self.SearchRoot(state, depth)
+            except SearchTimeout:
+                break
+            bestMove = move
+            self.pv = pv
+            self.depthReached = depth
+        return bestMove
+
+    def SearchRoot(self, state, depth):
+        """
+        One iteration of iterative deepening, returns the best move and the principal variation.
+        """
+        bestMove = None
+        bestScore = -float('inf')
+        alpha = -float('inf')
+        beta = float('inf')
+        toMove = 3 - state.playerJustMoved
+        sign = 1 if toMove == 1 else -1
+        for move in self.OrderMoves(state, state.GetMoves(), 0):
+            score = self.SearchChild(state, move, depth=depth - 1, alpha=alpha, beta=beta, maximizingPlayer=(toMove == 2))
+            if sign * score > bestScore:
+                bestScore = sign * score
+                bestMove = move
+                self.pvTable[0] = [move] + self.pvTable[1]
+            if toMove == 1:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+        return bestMove, self.pvTable[0]
+
+    def OrderMoves(self, state, moves, ply):
+        """
+        Orders moves for iterative deepening: the previous principal variation move first, then
+        killer moves for this ply, then by history score with central columns breaking ties.
+        """
+        player = 3 - state.playerJustMoved
+        history = self.history[player]
+        killers = self.killers.get(ply, [])
+        pvMove = self.pv[ply] if ply < len(self.pv) else None
+
+        def priority(move):
+            if move == pvMove:
+                return (0, 0, 0)
+            if move in killers:
+                return (1, killers.index(move), 0)
+            return (2, -history[move], abs(move - state.width // 2))
+
+        return sorted(moves, key=priority)
+
+    def RecordCutoff(self, state, move, depth, ply):
+        """
+        Remembers a move that caused a cut-off as a killer for this ply and raises its history score.
+        """
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[3 - state.playerJustMoved][move] += depth * depth
+
+    def CheckLimits(self):
+        if self.evaluations >= self.computational_budget:
+            raise SearchTimeout()
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
     def calculate_depth(self, budget, branching_factor=7):
         """
         Calculate the maximum depth based on the computational budget.
@@ -97,24 +392,29 @@ class Player1:
         """
         Enhanced evaluation function for Player1.
         Evaluates the board state based on opportunities, threats, and forks.
+        When the state carries an incremental evaluator its running score is used instead.
         """
+        if state.evaluator is not None:
+            return state.evaluator.score
+
         score = 0
         center_column = state.width // 2
+        board = state.board
 
         # Center control weighting
         center_weight = 4
         for row in range(state.height):
-            if state.board[center_column][row] == 1:
+            if board[center_column][row] == 1:
                 score += center_weight
-            elif state.board[center_column][row] == 2:
+            elif board[center_column][row] == 2:
                 score -= center_weight
 
         # Evaluate each cell for both players
         for x in range(state.width):
             for y in range(state.height):
-                if state.board[x][y] == 1:  # Player 1's piece
+                if board[x][y] == 1:  # Player 1's piece
                     score += self.EvaluatePosition(state, x, y, 1)
-                elif state.board[x][y] == 2:  # Player 2's piece
+                elif board[x][y] == 2:  # Player 2's piece
                     score -= self.EvaluatePosition(state, x, y, 2)
 
         return score
@@ -127,6 +427,7 @@ class Player1:
         directions = [(0, 1), (1, 0), (1, 1), (1, -1)]  # Vertical, horizontal, diagonal
         position_score = 0
         opponent = 3 - player
+        board = state.board
 
         for dx, dy in directions:
             count = 1
@@ -135,9 +436,9 @@ class Player1:
             # Check forward direction
             step = 1
             while state.IsOnBoard(x + step * dx, y + step * dy):
-                if state.board[x + step * dx][y + step * dy] == player:
+                if board[x + step * dx][y + step * dy] == player:
                     count += 1
-                elif state.board[x + step * dx][y + step * dy] == opponent:
+                elif board[x + step * dx][y + step * dy] == opponent:
                     blocked_front = True
                     break
                 else:
@@ -147,9 +448,9 @@ class Player1:
             # Check backward direction
             step = 1
             while state.IsOnBoard(x - step * dx, y - step * dy):
-                if state.board[x - step * dx][y - step * dy] == player:
+                if board[x - step * dx][y - step * dy] == player:
                     count += 1
-                elif state.board[x - step * dx][y - step * dy] == opponent:
+                elif board[x - step * dx][y - step * dy] == opponent:
                     blocked_back = True
                     break
                 else:
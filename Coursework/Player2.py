@@ -1,5 +1,12 @@
 import random
+import sys
+import time
 from math import sqrt, log
+from multiprocessing import util
+from mcts_tree import ArrayTree, LeaderSettled
+from opening_book import OpeningBook
+from rollouts import BatchRollout, SeededGenerator
+from solver import Solver
 
 # The implementaion of MCTS for player 2 was designed and written by James Stovold and further adjusted to fit the coursework
 
@@ -15,8 +22,12 @@ class Node:
         
         self.wins = 0
         self.visits = 0
+        self.amafWins = 0  # All-moves-as-first statistics for RAVE: results of simulations in which
+        self.amafVisits = 0  # this node's move was played later on by the same player
         self.untriedMoves = state.GetMoves()  # Future childNodes
         self.playerJustMoved = state.playerJustMoved  # To check who won or who lost.
+        self.treeSize = 1  # Nodes in the subtree below (and including) this node
+        self.treeDepth = 0  # Depth of the deepest node of that subtree, counted from this node
 
     def IsFullyExpanded(self):
         return self.untriedMoves == []
@@ -31,15 +42,22 @@ class Node:
         node = Node(move=move, parent=self, state=state)
         self.untriedMoves.remove(move)
         self.childNodes.append(node)
+        ancestor, depth = self, 1
+        while ancestor is not None:  # Keep subtree sizes and depths current so stats never walk the tree
+            ancestor.treeSize += 1
+            if ancestor.treeDepth < depth:
+                ancestor.treeDepth = depth
+            ancestor, depth = ancestor.parentNode, depth + 1
         return node
 
-    def Update(self, result):
+    def Update(self, result, visits=1):
         """
         Updates the node statistics saved in this node with the param result
          which is the information obtained during the latest rollout.
-        :param result: (bool) 1 for victory, 0 for draw / loss.
+        :param result: (bool) 1 for victory, 0 for draw / loss, or the number of wins in a batch.
+        :param visits: number of rollouts result covers.
         """
-        self.visits += 1
+        self.visits += visits
         self.wins += result
 
 
@@ -47,12 +65,23 @@ def UCB1(node, child, exploration_constant=sqrt(2)):
     return child.wins / child.visits + exploration_constant * sqrt(log(node.visits) / child.visits)
 
 
+def UCB1_RAVE(node, child, exploration_constant=sqrt(2), rave_equivalence=300):
+    """
+    UCB1 on a mix of the child's own win rate and its AMAF win rate. The AMAF share starts at 1
+    and falls as the child gets visits, to one half at rave_equivalence / 3 visits.
+    """
+    beta = sqrt(rave_equivalence / (3 * child.visits + rave_equivalence))
+    amaf = child.amafWins / child.amafVisits if child.amafVisits else 0
+    value = (1 - beta) * child.wins / child.visits + beta * amaf
+    return value + exploration_constant * sqrt(log(node.visits) / child.visits)
+
+
 def selection_phase(node, state, selection_policy=UCB1, selection_policy_args=[]):
     if not node.IsFullyExpanded() or node.childNodes == []:
         return node
     selected_node = sorted(node.childNodes, key=lambda child: selection_policy(node, child, *selection_policy_args))[-1]
     state.DoMove(selected_node.move)
-    return selection_phase(selected_node, state)
+    return selection_phase(selected_node, state, selection_policy, selection_policy_args)
 
 
 def expansion_phase(node, state):
@@ -68,17 +97,102 @@ def rollout_phase(state):
         state.DoMove(random.choice(state.GetMoves()))
 
 
+def decisive_rollout_phase(state):
+    """
+    Rollout that never misses an immediate win and blocks the opponent's immediate win,
+    choosing at random among the other moves.
+    """
+    moves = state.GetMoves()
+    while moves != []:
+        player = 3 - state.playerJustMoved
+        move = next((m for m in moves if state.IsWinningMove(m, player)), None)
+        if move is None:
+            move = next((m for m in moves if state.IsWinningMove(m, 3 - player)), None)
+        if move is None:
+            move = random.choice(moves)
+        state.DoMove(move)
+        moves = state.GetMoves()
+
+
 def backpropagation_phase(node, state):
     if node is not None:
         node.Update(state.GetResult(node.playerJustMoved))
         backpropagation_phase(node.parentNode, state)
 
 
+def rave_backpropagation_phase(node, state, rootDepth):
+    """
+    Backpropagation that also updates AMAF statistics: at every node on the way up, each child
+    whose move its player made at any later point of the simulation counts the result.
+    :param rootDepth: Length of the move history of the root state, later moves belong to this simulation.
+    """
+    played = [move for move, _ in state.moveHistory[rootDepth:]]
+    depth = 0
+    root = node
+    while root.parentNode is not None:
+        depth += 1
+        root = root.parentNode
+    first = 3 - root.playerJustMoved  # Player of played[0], players alternate from there
+
+    def player(index):
+        return first if index % 2 == 0 else 3 - first
+
+    seen = {(player(i), played[i]) for i in range(depth, len(played))}
+    while node is not None:
+        node.Update(state.GetResult(node.playerJustMoved))
+        for child in node.childNodes:
+            if (child.playerJustMoved, child.move) in seen:
+                child.amafVisits += 1
+                child.amafWins += state.GetResult(child.playerJustMoved)
+        depth -= 1
+        if depth >= 0:
+            seen.add((player(depth), played[depth]))
+        node = node.parentNode
+
+
+def batch_backpropagation_phase(node, counts):
+    """
+    Backs up a batch of rollouts in one step.
+    :param counts: [draws, player 1 wins, player 2 wins] as returned by BatchRollout.
+    """
+    playouts = int(counts[0] + counts[1] + counts[2])
+    while node is not None:
+        node.Update(int(counts[node.playerJustMoved]), playouts)
+        node = node.parentNode
+
+
 def action_selection_phase(node):
     return sorted(node.childNodes, key=lambda c: c.wins / c.visits)[-1].move
 
 
-def MCTS_UCT(rootstate, itermax, exploration_factor_ucb1=sqrt(2)):
+def RootSettled(node, remaining):
+    """
+    Returns True when `remaining` more visits below node can not take the lead in visits away from
+    the child action_selection_phase returns, see LeaderSettled.
+    """
+    return LeaderSettled([(child.wins, child.visits) for child in node.childNodes], len(node.untriedMoves), remaining)
+
+
+CHECK_EVERY = 16  # Iterations between checks of the early termination rule, the clock is read every iteration
+
+
+def SearchDone(iterations, itermax, startTime, deadline, settled, playouts=1):
+    """
+    Returns True when a search that has run `iterations` iterations should stop early: the iterations
+    left can no longer change the move the search returns. With a deadline the iterations left are
+    estimated from the rate so far.
+    :param settled: Function taking the root visits left and returning True when they can not change the move.
+    :param playouts: Root visits added by one iteration (the batch size with batch rollouts).
+    """
+    now = time.perf_counter()
+    remaining = itermax - iterations
+    if deadline is not None:
+        remaining = min(remaining, iterations / max(now - startTime, 1e-9) * (deadline - now))
+    return settled(remaining * playouts)
+
+
+def MCTS_UCT(rootstate, itermax, exploration_factor_ucb1=sqrt(2), rootnode=None, batch_rollouts=0, rave_equivalence=0,
+             rollout_policy=rollout_phase, time_limit=None, early_stop=False):
     """ 
     Conducts a game tree search using the MCTS-UCT algorithm
     for a total of param itermax iterations. The search begins
@@ -87,29 +201,397 @@ def MCTS_UCT(rootstate, itermax, exploration_factor_ucb1=sqrt(2)):
 
     :param rootstate: The game state for which an action must be selected.
     :param itermax: number of MCTS iterations to be carried out. Also known as the computational budget.
+    :param rootnode: Existing tree for rootstate to keep searching, a new one is built when None.
+    :param batch_rollouts: Leaf-parallel mode: run this many random games from every new leaf
+        at once with BatchRollout (needs numpy) instead of a single rollout.
+    :param rave_equivalence: When above 0, select with UCB1_RAVE using this equivalence parameter
+        and keep AMAF statistics. Not used with batch_rollouts, whose games are not replayed on the state.
+    :param rollout_policy: Function playing state to the end, rollout_phase or decisive_rollout_phase.
+    :param time_limit: Seconds the search may take. itermax may then be float('inf') to search until the time is up.
+    :param early_stop: Stop as soon as the most visited root child can no longer be overtaken in visits by the
+        iterations left and also has the best win rate, the move that is then played.
     :returns: (int) Action that will be taken by an agent.
     """
-    rootnode = Node(state=rootstate)
-    
-    for i in range(itermax):
+    if rootnode is None:
+        rootnode = Node(state=rootstate)
+    rave = rave_equivalence > 0 and not batch_rollouts
+    if rave:
+        policy, policyArgs = UCB1_RAVE, [exploration_factor_ucb1, rave_equivalence]
+    else:
+        policy, policyArgs = UCB1, [exploration_factor_ucb1]
+    rootDepth = len(rootstate.moveHistory)
+    startTime = time.perf_counter()
+    deadline = startTime + time_limit if time_limit is not None else None
+    rng = SeededGenerator() if batch_rollouts else None  # One generator per search, drawn from random
+
+    iterations = 0
+    while iterations < itermax:
+        if deadline is not None and time.perf_counter() >= deadline:  # Every iteration, batched ones can be slow
+            break
+        if early_stop and iterations % CHECK_EVERY == 1 and SearchDone(
+                iterations, itermax, startTime, deadline, lambda remaining: RootSettled(rootnode, remaining),
+                batch_rollouts or 1):
+            break
+        iterations += 1
         node  = rootnode
         state = rootstate.Clone()
 
-        node  = selection_phase(node, state, selection_policy=UCB1, selection_policy_args=[exploration_factor_ucb1])
+        node  = selection_phase(node, state, selection_policy=policy, selection_policy_args=policyArgs)
 
         node  = expansion_phase(node, state)
-            
-        rollout_phase(state)
-            
-        backpropagation_phase(node, state)
-    
+
+        if batch_rollouts:
+            batch_backpropagation_phase(node, BatchRollout(state, batch_rollouts, rng))
+            continue
+
+        rollout_policy(state)
+
+        if rave:
+            rave_backpropagation_phase(node, state, rootDepth)
+        else:
+            backpropagation_phase(node, state)
+
     return action_selection_phase(rootnode)
 
 
+def MCTS_UCT_Array(rootstate, itermax, exploration_factor_ucb1=sqrt(2), tree=None, max_nodes=None, batch_rollouts=0,
+                   rollout_policy=rollout_phase, time_limit=None, early_stop=False):
+    """
+    Same search as MCTS_UCT on an ArrayTree: selection is an argmax over the children and
+    selection and backpropagation are loops, so deep trees cannot hit the recursion limit.
+
+    :param rootstate: The game state for which an action must be selected.
+    :param itermax: number of MCTS iterations to be carried out.
+    :param tree: ArrayTree whose node 0 is rootstate, a new one is built when None.
+    :param max_nodes: Node cap of the new tree, itermax + 1 by default (2 ** 16 without an iteration limit).
+    :param batch_rollouts: Leaf-parallel mode, see MCTS_UCT.
+    :param rollout_policy: See MCTS_UCT.
+    :param time_limit, early_stop: See MCTS_UCT.
+    :returns: (int) Action that will be taken by an agent.
+    """
+    if tree is None:
+        if max_nodes is None:
+            max_nodes = itermax + 1 if itermax != float('inf') else 1 << 16
+        tree = ArrayTree(max_nodes)
+        tree.AddNode(None, -1, rootstate)
+    startTime = time.perf_counter()
+    deadline = startTime + time_limit if time_limit is not None else None
+    rng = SeededGenerator() if batch_rollouts else None  # One generator per search, drawn from random
+
+    iterations = 0
+    while iterations < itermax:
+        if deadline is not None and time.perf_counter() >= deadline:  # Every iteration, batched ones can be slow
+            break
+        if early_stop and iterations % CHECK_EVERY == 1 and SearchDone(
+                iterations, itermax, startTime, deadline, lambda remaining: tree.BestMoveSettled(0, remaining),
+                batch_rollouts or 1):
+            break
+        iterations += 1
+        state = rootstate.Clone()
+        node = tree.Select(0, state, exploration_factor_ucb1)
+        node = tree.Expand(node, state)
+        if batch_rollouts:
+            tree.BackpropagateBatch(node, BatchRollout(state, batch_rollouts, rng))
+            continue
+        rollout_policy(state)
+        tree.Backpropagate(node, state)
+
+    return tree.BestMove(0)
+
+
+def TreeSize(node):
+    """
+    Returns (nodes, bytes) for the tree below (and including) node. bytes is estimated from the
+    size of one node object and its attribute dict, two empty lists and a list slot per move of
+    node (every move is either untried or a child), so no walk over the tree is needed.
+    """
+    slots = len(node.childNodes) + len(node.untriedMoves)
+    perNode = sys.getsizeof(node) + sys.getsizeof(node.__dict__) + 2 * sys.getsizeof([]) + 8 * slots
+    return node.treeSize, node.treeSize * perNode
+
+
+def TreeShape(node):
+    """
+    Returns (nodes, depth) for the tree below (and including) node, depth being that of its deepest node.
+    """
+    return node.treeSize, node.treeDepth
+
+
+def ShutdownPool(pool):
+    pool.close()
+    pool.join()
+
+
 # Example `choose_move` method for a player
 class Player2:
-    def __init__(self, computational_budget):
+    def __init__(self, computational_budget, reuse_tree=True, tree="array", max_nodes=None, batch_rollouts=0, workers=1,
+                 endgame_cells=16, opening_book=None, hooks=None, exploration_factor_ucb1=sqrt(2), rave=0,
+                 decisive_rollouts=False, time_limit=None, early_stop=False, carry_budget=False):
+        """
+        :param computational_budget: Number of MCTS iterations per move, may be float('inf') with a time_limit.
+        :param reuse_tree: Keep the search tree between moves and continue from the subtree
+            of the position reached after our move and the opponent's reply.
+        :param tree: "array" to search on an ArrayTree, "node" for the tree of Node objects.
+        :param max_nodes: Node cap of the ArrayTree, by default twice the budget. Once the cap
+            is reached the tree stops growing and the remaining iterations only update statistics.
+        :param batch_rollouts: When set, every iteration plays this many random games from its leaf
+            at once with NumPy and backs them up together (leaf parallelism). The NumPy overhead per
+            ply only pays off for batches of several hundred games or more.
+        :param workers: Root parallelism: split the budget over this many independent trees searched in
+            a pool of worker processes and merge their root statistics. The pool is kept between moves
+            until Close is called, the player is used as a context manager or garbage collected, or the
+            process exits. Not available inside daemonic pool workers such as simulate_games.
+        :param endgame_cells: With this many empty cells or fewer the position is solved exactly
+            instead of sampled, 0 disables the solver.
+        :param opening_book: Path of a book built by opening_book.py, consulted before searching.
+        :param hooks: Callables called as hook(player, move_stats) after every move, for profiling.
+        :param exploration_factor_ucb1: Exploration constant of UCB1.
+        :param rave: RAVE equivalence parameter, 0 disables RAVE. Needs tree="node".
+        :param decisive_rollouts: Roll out with decisive_rollout_phase, which always takes an immediate
+            win and blocks an immediate loss, instead of uniformly random moves.
+        :param time_limit: Seconds per move, the search stops at whichever of the two limits comes first.
+        :param early_stop: Stop a search once its most visited root move can not be overtaken in visits any more
+            and has the best win rate. Root parallel searches always run their full budget.
+        :param carry_budget: Iterations (and seconds) a move leaves unused, through early_stop or a single
+            legal move, are added to later moves, each move taking at most its own budget again from them.
+        """
+        if rave and tree != "node":
+            raise ValueError('RAVE statistics are kept on the Node tree, use tree="node"')
         self.computational_budget = computational_budget
+        self.reuse_tree = reuse_tree
+        self.tree = tree
+        if max_nodes is None:
+            max_nodes = 2 * computational_budget + 1 if computational_budget != float('inf') else 1 << 16
+        self.max_nodes = max_nodes
+        self.batch_rollouts = batch_rollouts
+        self.workers = workers
+        self.exploration_factor_ucb1 = exploration_factor_ucb1
+        self.rave = rave
+        self.rollout_policy = decisive_rollout_phase if decisive_rollouts else rollout_phase
+        self.time_limit = time_limit
+        self.early_stop = early_stop
+        self.carry_budget = carry_budget
+        self.bank = [0, 0.0]  # Iterations and seconds left unused by earlier moves of this game
+        self.budget = (0, None)  # Iterations and seconds the last search was allowed
+        self.iterations = 0  # Iterations the last search ran
+        self.pool = None
+        self.poolFinalizer = None  # Shuts the pool down if Close is never called
+        self.solver = Solver(max_empty=endgame_cells) if endgame_cells > 0 else None
+        self.endgame_result = None  # (result, distance) proven by the solver for the last move
+        self.opening_book = OpeningBook.Open(opening_book) if opening_book is not None else None
+        self.rootnode = None  # Tree of the last search, a Node or an ArrayTree rooted at index 0
+        self.lastState = None  # Position after our last move, used to find the opponent's reply
+        self.tree_reuse = {}  # Statistics about the tree kept for the last move
+        self.source = None  # How the last move was chosen
+        self.searched = None  # Tree (or merged root statistics) searched for the last move
+        self.move_stats = {}  # Statistics of the last move, see choose_move
+        self.hooks = list(hooks) if hooks is not None else []
+
+    def Children(self, node):
+        """
+        Returns (move, child) pairs for a Node, or for an index of the ArrayTree of the last search.
+        """
+        if self.tree == "array":
+            return [(self.rootnode.move[child], child) for child in self.rootnode.Children(node)]
+        return [(child.move, child) for child in node.childNodes]
+
+    def ReusableRoot(self, state):
+        """
+        Returns the node of the previous tree that matches state, or None when the position
+        is not our last move followed by one opponent move.
+        """
+        if self.rootnode is None or self.lastState is None:
+            return None
+        ourMove = self.lastState.moveHistory[-1][0] if self.lastState.moveHistory else None
+        root = 0 if self.tree == "array" else self.rootnode
+        ourNode = next((child for move, child in self.Children(root) if move == ourMove), None)
+        if ourNode is None:
+            return None
+        for move, reply in self.Children(ourNode):
+            candidate = self.lastState.Clone()
+            candidate.DoMove(move)
+            if candidate.hash == state.hash and candidate.playerJustMoved == state.playerJustMoved \
+                    and candidate.GetMoves() == state.GetMoves():
+                return reply
+        return None
+
+    def Close(self):
+        """
+        Shuts down the worker pool used for root parallel search.
+        """
+        if self.poolFinalizer is not None:
+            self.poolFinalizer()  # Runs ShutdownPool once and unregisters it
+            self.poolFinalizer = None
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.Close()
+
+    def Reset(self):
+        """
+        Drops the tree kept from the previous move so the player can start a new game.
+        """
+        self.rootnode = None
+        self.lastState = None
+        self.tree_reuse = {}
+        self.endgame_result = None
+        self.bank = [0, 0.0]
+        if self.solver is not None:
+            self.solver.table = {}
 
     def choose_move(self, state):
-        return MCTS_UCT(state, self.computational_budget)
+        """
+        Returns the move to play in state. Statistics of the decision are left in self.move_stats:
+        source ("book", "solver", "forced" for a single legal move, or "search"), time in seconds,
+        the iterations run, the iterations and seconds this move was allowed ("budget", "time_budget")
+        and how much of them it left unused ("saved", "time_saved"), the tree kept from the previous move
+        (see tree_reuse), and for a search the nodes in the tree, its maximum depth and the visits of
+        each root move. Every hook is then called with them.
+        """
+        start_time = time.perf_counter()
+        self.searched = None
+        self.iterations = 0
+        self.budget = (0, None)
+        move = self.SelectMove(state)
+        elapsed = time.perf_counter() - start_time
+        self.move_stats = {"source": self.source, "time": elapsed, "iterations": self.iterations,
+                           "tree_nodes": 0, "max_depth": 0, "root_visits": {}}
+        self.move_stats.update(self.tree_reuse)
+        if self.source in ("search", "forced"):
+            self.move_stats.update(self.SpendBudget(elapsed))
+        if self.searched is not None:
+            self.move_stats.update(self.SearchStats(self.searched))
+            self.searched = None  # Do not keep a tree alive that reuse_tree did not ask for
+        for hook in self.hooks:
+            hook(self, self.move_stats)
+        return move
+
+    def SearchStats(self, searched):
+        """
+        Returns the search part of move_stats for an ArrayTree, a root Node, or the merged
+        {move: [visits, wins]} of a root parallel search (whose trees stay in the workers).
+        """
+        stats = {}
+        if isinstance(searched, ArrayTree):
+            stats["tree_nodes"], stats["max_depth"] = searched.size, searched.MaxDepth()
+            stats["root_visits"] = {searched.move[child]: searched.visits[child] for child in searched.Children(0)}
+        elif isinstance(searched, Node):
+            stats["tree_nodes"], stats["max_depth"] = TreeShape(searched)
+            stats["root_visits"] = {child.move: child.visits for child in searched.childNodes}
+        else:
+            stats["root_visits"] = {move: totals[0] for move, totals in searched.items()}
+        return stats
+
+    def MoveBudget(self):
+        """
+        Returns (iterations, seconds) the next search may use: the base budget plus, with carry_budget,
+        up to as much again from the bank. seconds is None without a time limit.
+        """
+        iterations, seconds = self.computational_budget, self.time_limit
+        if self.carry_budget:
+            if iterations != float('inf'):
+                iterations += min(self.bank[0], iterations)
+            if seconds is not None:
+                seconds += min(self.bank[1], seconds)
+        return iterations, seconds
+
+    def SpendBudget(self, elapsed):
+        """
+        Banks what this move left of its base budget when carry_budget is on and returns the budget
+        part of move_stats. Limits that do not apply are reported as None.
+        """
+        iterations, seconds = self.budget
+        finite = iterations != float('inf')
+        if self.carry_budget:
+            if finite:
+                self.bank[0] = max(0, self.bank[0] + self.computational_budget - self.iterations)
+            if seconds is not None:
+                self.bank[1] = max(0.0, self.bank[1] + self.time_limit - elapsed)
+        return {"budget": iterations if finite else None, "saved": iterations - self.iterations if finite else None,
+                "time_budget": seconds, "time_saved": max(0.0, seconds - elapsed) if seconds is not None else None}
+
+    def SelectMove(self, state):
+        self.source = "search"
+        if self.opening_book is not None:
+            entry = self.opening_book.Lookup(state)
+            if entry is not None:
+                self.source = "book"
+                self.rootnode = None  # No tree was searched, the next move starts a new one
+                self.tree_reuse = {"reused": False, "retained_nodes": 0, "retained_bytes": 0, "retained_visits": 0}
+                return entry[0]
+
+        self.endgame_result = None
+        if self.solver is not None and self.solver.CanSolve(state):
+            move, result, distance = self.solver.BestMove(state)
+            self.endgame_result = (result, distance)
+            self.source = "solver"
+            self.rootnode = None  # No tree was searched, the next move starts a new one
+            self.tree_reuse = {"reused": False, "retained_nodes": 0, "retained_bytes": 0, "retained_visits": 0}
+            return move
+
+        self.budget = self.MoveBudget()
+        itermax, seconds = self.budget
+        playouts = self.batch_rollouts or 1
+        moves = state.GetMoves()
+        if len(moves) == 1:
+            self.source = "forced"
+            self.rootnode = None  # No tree was searched, the next move starts a new one
+            self.tree_reuse = {"reused": False, "retained_nodes": 0, "retained_bytes": 0, "retained_visits": 0}
+            return moves[0]
+
+        if self.workers > 1:
+            from multiprocessing import Pool
+            from parallel_mcts import RootParallelMCTS
+
+            if self.pool is None:
+                self.pool = Pool(self.workers)
+                # Runs when the player is garbage collected or, like atexit, when the process (including
+                # a pool worker, where atexit handlers are skipped) exits without calling Close
+                self.poolFinalizer = util.Finalize(self, ShutdownPool, args=(self.pool,), exitpriority=10)
+            self.tree_reuse = {"reused": False, "retained_nodes": 0, "retained_bytes": 0, "retained_visits": 0}
+            move, self.searched = RootParallelMCTS(state, itermax, self.pool, self.workers,
+                                                   self.exploration_factor_ucb1, self.batch_rollouts,
+                                                   self.rollout_policy is decisive_rollout_phase, seconds)
+            self.iterations = sum(visits for visits, _ in self.searched.values()) // playouts
+            return move
+
+        reused = self.ReusableRoot(state) if self.reuse_tree else None
+        self.tree_reuse = {"reused": reused is not None, "retained_nodes": 0, "retained_bytes": 0, "retained_visits": 0}
+
+        if self.tree == "array":
+            if reused is not None:
+                rootnode = self.rootnode.Extract(reused, self.max_nodes)
+                self.tree_reuse["retained_nodes"] = rootnode.size
+                self.tree_reuse["retained_bytes"] = rootnode.UsedBytes()
+                self.tree_reuse["retained_visits"] = rootnode.visits[0]
+            else:
+                rootnode = ArrayTree(self.max_nodes)
+                rootnode.AddNode(None, -1, state)
+            visitsBefore = rootnode.visits[0]
+            move = MCTS_UCT_Array(state, itermax, self.exploration_factor_ucb1, tree=rootnode,
+                                  batch_rollouts=self.batch_rollouts, rollout_policy=self.rollout_policy,
+                                  time_limit=seconds, early_stop=self.early_stop)
+            self.iterations = (rootnode.visits[0] - visitsBefore) // playouts
+        else:
+            rootnode = reused
+            if rootnode is not None:
+                rootnode.parentNode = None  # Let the rest of the old tree be freed
+                self.tree_reuse["retained_nodes"], self.tree_reuse["retained_bytes"] = TreeSize(rootnode)
+                self.tree_reuse["retained_visits"] = rootnode.visits
+            else:
+                rootnode = Node(state=state)
+            visitsBefore = rootnode.visits
+            move = MCTS_UCT(state, itermax, self.exploration_factor_ucb1, rootnode=rootnode,
+                            batch_rollouts=self.batch_rollouts, rave_equivalence=self.rave,
+                            rollout_policy=self.rollout_policy, time_limit=seconds, early_stop=self.early_stop)
+            self.iterations = (rootnode.visits - visitsBefore) // playouts
+
+        self.searched = rootnode
+        if self.reuse_tree:
+            self.rootnode = rootnode
+            self.lastState = state.Clone()
+            self.lastState.DoMove(move)
+        return move
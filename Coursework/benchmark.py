@@ -0,0 +1,175 @@
+import argparse
+import json
+import random
+import sys
+import time
+from game_logic import Connect4State, BitboardConnect4State
+from evaluation import WindowEvaluator, BatchEvaluator, np
+from Player1 import Player1
+from Player2 import MCTS_UCT, MCTS_UCT_Array
+
+'''
+Microbenchmarks for the engine hot paths on a fixed set of positions.
+Save a baseline, then compare later runs against it; the script exits with status 1 when
+any benchmark is slower than the baseline by more than the threshold:
+python benchmark.py --save baseline.json
+python benchmark.py --compare baseline.json --threshold 0.2
+'''
+
+# Positions as the columns played from an empty board, Player 1 first
+POSITIONS = {
+    "empty": "",
+    "opening": "3323",
+    "middlegame": "33224421155",
+    "late": "3322442115566006611",
+}
+
+
+def MakeState(cls, moves):
+    state = cls()
+    for move in moves:
+        state.DoMove(int(move))
+    return state
+
+
+def Measure(operation, min_time=0.2, repeats=3):
+    """
+    Returns the best rate in operations per second over `repeats` runs of at least min_time
+    seconds each. operation() runs one batch and returns how many operations it did.
+    """
+    best = 0
+    for _ in range(repeats):
+        count = 0
+        start_time = time.perf_counter()
+        while True:
+            count += operation()
+            elapsed = time.perf_counter() - start_time
+            if elapsed >= min_time:
+                break
+        best = max(best, count / elapsed)
+    return best
+
+
+def StateBenchmarks(cls, name, moves, min_time=0.2):
+    state = MakeState(cls, moves)
+    legal = state.GetMoves()
+    lastCol = int(moves[-1]) if moves else legal[0]
+    lastRow = max((row for row in range(state.height) if state.board[lastCol][row] != 0), default=0)
+
+    def do_move():
+        for move in legal:
+            st = state.Clone()
+            st.DoMove(move)
+        return len(legal)
+
+    def clone():
+        for _ in range(100):
+            state.Clone()
+        return 100
+
+    def get_moves():
+        for _ in range(100):
+            state.GetMoves()
+        return 100
+
+    def does_move_win():
+        for _ in range(100):
+            state.DoesMoveWin(lastCol, lastRow)
+        return 100
+
+    return {
+        f"{name}.Clone+DoMove": Measure(do_move, min_time),
+        f"{name}.Clone": Measure(clone, min_time),
+        f"{name}.GetMoves": Measure(get_moves, min_time),
+        f"{name}.DoesMoveWin": Measure(does_move_win, min_time),
+    }
+
+
+def RunBenchmarks(min_time=0.2):
+    """
+    Runs every benchmark and returns {benchmark name: operations per second}.
+    """
+    results = {}
+    for position, moves in POSITIONS.items():
+        for cls, label in ((Connect4State, "Connect4State"), (BitboardConnect4State, "BitboardConnect4State")):
+            results.update(StateBenchmarks(cls, f"{label}.{position}", moves, min_time))
+
+        state = MakeState(BitboardConnect4State, moves)
+        player = Player1(computational_budget=float('inf'), incremental_eval=False)
+        results[f"Player1.EvaluateState.{position}"] = Measure(lambda: (player.EvaluateState(state), 1)[1], min_time)
+        evalState = state.Clone()
+        evalState.evaluator = WindowEvaluator.FromState(evalState)
+        legal = evalState.GetMoves()
+        move = legal[0]
+
+        def incremental():
+            evalState.DoMove(move)
+            player.EvaluateState(evalState)
+            evalState.UndoMove()
+            return 1
+        results[f"WindowEvaluator.DoMove+UndoMove.{position}"] = Measure(incremental, min_time)
+
+        if np is not None:
+            batchEvaluator = BatchEvaluator(state.width, state.height, state.connect)
+            results[f"BatchEvaluator.EvaluateChildren.{position}"] = Measure(
+                lambda: len(batchEvaluator.EvaluateChildren(state, legal)), min_time)
+            ply = np.repeat(BatchEvaluator.Boards([state]), 1000, axis=0)
+            results[f"BatchEvaluator.Evaluate.1000.{position}"] = Measure(lambda: len(batchEvaluator.Evaluate(ply)), min_time)
+
+        def minimax():
+            searcher = Player1(computational_budget=2000, endgame_cells=0, tt_size=0)
+            searcher.choose_move(state)
+            return searcher.nodes
+        results[f"Player1.Minimax.nodes.{position}"] = Measure(minimax, min_time, repeats=1)
+
+        def mcts():
+            random.seed(0)
+            MCTS_UCT(state, 200)
+            return 200
+        results[f"MCTS_UCT.iterations.{position}"] = Measure(mcts, min_time, repeats=1)
+
+        def mcts_array():
+            random.seed(0)
+            MCTS_UCT_Array(state, 200)
+            return 200
+        results[f"MCTS_UCT_Array.iterations.{position}"] = Measure(mcts_array, min_time, repeats=1)
+    return results
+
+
+def Compare(results, baseline, threshold):
+    """
+    Returns the benchmarks whose rate fell below baseline * (1 - threshold), as
+    {name: (baseline rate, new rate)}.
+    """
+    return {name: (baseline[name], rate) for name, rate in results.items()
+            if name in baseline and rate < baseline[name] * (1 - threshold)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Connect 4 engine hot paths.")
+    parser.add_argument("--save", metavar="JSON", help="write the results as a new baseline")
+    parser.add_argument("--compare", metavar="JSON", help="fail if slower than this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown as a fraction")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per measurement")
+    args = parser.parse_args()
+
+    results = RunBenchmarks(args.min_time)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    for name, rate in results.items():
+        change = f"  ({rate / baseline[name] - 1:+.1%})" if name in baseline else ""
+        print(f"{name:60} {rate:14.0f}/s{change}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.save}")
+    if args.compare:
+        regressions = Compare(results, baseline, args.threshold)
+        for name, (old, new) in regressions.items():
+            print(f"REGRESSION {name}: {old:.0f}/s -> {new:.0f}/s")
+        if regressions:
+            sys.exit(1)
+        print(f"No benchmark slower than the baseline by more than {args.threshold:.0%}")
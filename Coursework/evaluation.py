@@ -0,0 +1,166 @@
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for BatchEvaluator
+    np = None
+
+_layouts = {}
+
+
+def WindowLayout(width, height, connect):
+    """
+    Returns (windows, cellWindows) for a board size: every line of `connect` cells that could
+    hold a win, as a list of cell indices (col * height + row), and for every cell the indices
+    of the windows that contain it. Computed once per board size.
+    """
+    if (width, height, connect) not in _layouts:
+        windows = []
+        for dx, dy in [(0, 1), (1, 0), (1, 1), (1, -1)]:  # Vertical, horizontal, diagonal
+            for x in range(width):
+                for y in range(height):
+                    endX, endY = x + (connect - 1) * dx, y + (connect - 1) * dy
+                    if 0 <= endX < width and 0 <= endY < height:
+                        windows.append([(x + i * dx) * height + (y + i * dy) for i in range(connect)])
+        cellWindows = [[] for _ in range(width * height)]
+        for index, window in enumerate(windows):
+            for cell in window:
+                cellWindows[cell].append(index)
+        _layouts[(width, height, connect)] = (windows, cellWindows)
+    return _layouts[(width, height, connect)]
+
+
+class WindowEvaluator:
+    """
+    Incremental version of the Player1 heuristic, scored from Player 1's point of view.
+    Every window of `connect` cells that only one player has pieces in is worth
+    weights[pieces] to that player: a full window is a win, connect - 1 pieces a threat,
+    connect - 2 an open line that can still grow. Pieces in the centre column add center_weight.
+    The state calls Place and Remove from DoMove and UndoMove, so the score is always current
+    and reading it at a leaf costs nothing.
+    """
+
+    def __init__(self, width, height, connect, center_weight=4):
+        self.width = width
+        self.height = height
+        self.connect = connect
+        self.windows, self.cellWindows = WindowLayout(width, height, connect)
+        weights = [0] * (connect + 1)
+        weights[connect] = 100000  # Winning line
+        if connect >= 2:
+            weights[connect - 1] = 100  # Threat: one more piece wins
+        if connect >= 3:
+            weights[connect - 2] = 10  # Building potential
+        weights[1] = max(weights[1], 1)
+        # value[mine][theirs] is the score of a window for player 1, blocked windows are worth nothing
+        self.value = [[weights[p1] if p2 == 0 else (-weights[p2] if p1 == 0 else 0) for p2 in range(connect + 1)]
+                      for p1 in range(connect + 1)]
+        self.cellBonus = [center_weight if cell // height == width // 2 else 0 for cell in range(width * height)]
+        self.counts = [None, [0] * len(self.windows), [0] * len(self.windows)]
+        self.score = 0
+
+    @classmethod
+    def FromState(cls, state, center_weight=4):
+        """
+        Builds an evaluator holding the pieces already on the board of state.
+        """
+        evaluator = cls(state.width, state.height, state.connect, center_weight)
+        for col in range(state.width):
+            for row in range(state.height):
+                if state.board[col][row] != 0:
+                    evaluator.Place(col, row, state.board[col][row])
+        return evaluator
+
+    def Clone(self):
+        ev = object.__new__(WindowEvaluator)
+        ev.__dict__.update(self.__dict__)
+        ev.counts = [None, self.counts[1][:], self.counts[2][:]]
+        return ev
+
+    def Place(self, col, row, player):
+        cell = col * self.height + row
+        ones, twos, value = self.counts[1], self.counts[2], self.value
+        mine = self.counts[player]
+        delta = 0
+        for w in self.cellWindows[cell]:
+            before = value[ones[w]][twos[w]]
+            mine[w] += 1
+            delta += value[ones[w]][twos[w]] - before
+        self.score += delta + (self.cellBonus[cell] if player == 1 else -self.cellBonus[cell])
+
+    def Remove(self, col, row, player):
+        cell = col * self.height + row
+        ones, twos, value = self.counts[1], self.counts[2], self.value
+        mine = self.counts[player]
+        delta = 0
+        for w in self.cellWindows[cell]:
+            before = value[ones[w]][twos[w]]
+            mine[w] -= 1
+            delta += value[ones[w]][twos[w]] - before
+        self.score += delta - (self.cellBonus[cell] if player == 1 else -self.cellBonus[cell])
+
+    def Evaluate(self):
+        return self.score
+
+    def FullScore(self, board):
+        """
+        Scores board from scratch with the same weights, used to check the running score.
+        """
+        score = 0
+        for window in self.windows:
+            pieces = [board[cell // self.height][cell % self.height] for cell in window]
+            score += self.value[pieces.count(1)][pieces.count(2)]
+        for col in range(self.width):
+            for row in range(self.height):
+                cell = col * self.height + row
+                if board[col][row] == 1:
+                    score += self.cellBonus[cell]
+                elif board[col][row] == 2:
+                    score -= self.cellBonus[cell]
+        return score
+
+
+class BatchEvaluator:
+    """
+    Scores many boards at once with the WindowEvaluator weights, from Player 1's point of view.
+    Every window of every board is counted with NumPy array operations, so scoring all children
+    of a node (or a whole ply) is a handful of array operations instead of one Python call each.
+    """
+
+    def __init__(self, width, height, connect, center_weight=4):
+        if np is None:
+            raise ImportError("BatchEvaluator needs numpy, install it with: pip install numpy")
+        self.width = width
+        self.height = height
+        self.connect = connect
+        evaluator = WindowEvaluator(width, height, connect, center_weight)
+        self.windows = np.array(evaluator.windows, dtype=np.intp)  # (windows, connect) cell indices
+        # A window's code is the sum of its cell codes, (connect + 1) * p1 + p2, and indexes the flat value table
+        self.cellCode = np.array([0, connect + 1, 1], dtype=np.intp)
+        self.value = np.array(evaluator.value, dtype=np.int64).ravel()
+        self.cellSign = np.array([0, 1, -1], dtype=np.int64)
+        self.cellBonus = np.array(evaluator.cellBonus, dtype=np.int64)
+
+    @staticmethod
+    def Boards(states):
+        """
+        Stacks the boards of states into one (len(states), width, height) array.
+        """
+        return np.array([state.board for state in states], dtype=np.int8)
+
+    def Evaluate(self, boards):
+        """
+        :param boards: Array of shape (n, width, height) holding 0, 1 and 2.
+        :returns: Array of the n scores.
+        """
+        flat = boards.reshape(len(boards), self.width * self.height)
+        codes = self.cellCode[flat][:, self.windows].sum(axis=2)  # (n, windows)
+        return self.value[codes].sum(axis=1) + self.cellSign[flat] @ self.cellBonus
+
+    def EvaluateChildren(self, state, moves):
+        """
+        Returns the scores of the positions reached by playing each of moves in state, without playing them.
+        """
+        board = np.array(state.board, dtype=np.int8)
+        boards = np.repeat(board[np.newaxis], len(moves), axis=0)
+        rows = [self.height - state.board[move].count(0) for move in moves]
+        boards[np.arange(len(moves)), moves, rows] = 3 - state.playerJustMoved
+        return self.Evaluate(boards)
@@ -1,4 +1,6 @@
 import colorama
+import random
+from bisect import insort
 from colorama import Fore, Back
 from Player1 import Player1
 from Player2 import Player2
@@ -7,6 +9,22 @@ Run this file in order to run a single game between player 1 and player 2
 In PlayGame change the number of the computational budget for both of the players
 '''
 
+_zobristTables = {}
+
+
+def ZobristKeys(width, height):
+    """
+    Returns ([None, player 1 keys, player 2 keys], side to move key) of random 64 bit numbers,
+    one per cell, for a board of the given size. The keys come from a fixed seed so the same
+    position hashes the same in every process.
+    """
+    if (width, height) not in _zobristTables:
+        rng = random.Random(width * 1000 + height)
+        keys = [None] + [[rng.getrandbits(64) for _ in range(width * height)] for _ in (1, 2)]
+        _zobristTables[(width, height)] = (keys, rng.getrandbits(64))
+    return _zobristTables[(width, height)]
+
+
 class GameState:
     def __init__(self):
         self.playerJustMoved = 2  # Game starts with Player 1.
@@ -36,16 +54,25 @@ class Connect4State(GameState):
         self.width = width
         self.height = height
         self.connect = connect
+        self.moveHistory = []  # (column, winner before the move) for UndoMove
+        self.zobristKeys, self.zobristSide = ZobristKeys(width, height)
+        self.hash = 0  # Zobrist hash of the pieces, updated by DoMove/UndoMove
+        self.mirrorHash = 0  # Same hash for the board mirrored left to right
+        self.evaluator = None  # Optional incremental evaluator kept up to date by DoMove/UndoMove
         self.InitializeBoard()
 
     def InitializeBoard(self):
         self.board = [[0] * self.height for _ in range(self.width)]
 
     def Clone(self):
-        st = Connect4State(width=self.width, height=self.height)
+        st = Connect4State(width=self.width, height=self.height, connect=self.connect)
         st.playerJustMoved = self.playerJustMoved
         st.winner = self.winner
         st.board = [self.board[col][:] for col in range(self.width)]
+        st.moveHistory = self.moveHistory[:]
+        st.hash = self.hash
+        st.mirrorHash = self.mirrorHash
+        st.evaluator = self.evaluator.Clone() if self.evaluator is not None else None
         return st
 
     def DoMove(self, movecol):
@@ -56,9 +83,47 @@ class Connect4State(GameState):
         row += 1
         self.playerJustMoved = 3 - self.playerJustMoved
         self.board[movecol][row] = self.playerJustMoved
+        self.ToggleHash(self.playerJustMoved, movecol, row)
+        if self.evaluator is not None:
+            self.evaluator.Place(movecol, row, self.playerJustMoved)
+        self.moveHistory.append((movecol, self.winner))
         if self.DoesMoveWin(movecol, row):
             self.winner = self.playerJustMoved
 
+    def UndoMove(self):
+        """
+        Takes back the last move made with DoMove and returns its column.
+        """
+        movecol, self.winner = self.moveHistory.pop()
+        row = self.height - 1
+        while self.board[movecol][row] == 0:
+            row -= 1
+        self.ToggleHash(self.playerJustMoved, movecol, row)
+        if self.evaluator is not None:
+            self.evaluator.Remove(movecol, row, self.playerJustMoved)
+        self.board[movecol][row] = 0
+        self.playerJustMoved = 3 - self.playerJustMoved
+        return movecol
+
+    def ToggleHash(self, player, col, row):
+        keys = self.zobristKeys[player]
+        self.hash ^= keys[col * self.height + row]
+        self.mirrorHash ^= keys[(self.width - 1 - col) * self.height + row]
+
+    def CanonicalHash(self):
+        """
+        Returns (key, mirrored). The key is shared by this position and its mirror image and
+        includes the side to move, mirrored is True when it was taken from the mirrored board,
+        in which case moves stored under it must be flipped with width - 1 - move.
+        Only boards of odd width fold mirror images together: with an even width the centre bonus
+        of the evaluation goes to one of the two middle columns, so a position and its mirror
+        image can score differently.
+        """
+        side = self.zobristSide if self.playerJustMoved == 1 else 0
+        if self.width % 2 == 1 and self.mirrorHash < self.hash:
+            return self.mirrorHash ^ side, True
+        return self.hash ^ side, False
+
     def GetMoves(self):
         if self.winner != 0:
             return []
@@ -77,6 +142,16 @@ class Connect4State(GameState):
                 return True
         return False
 
+    def IsWinningMove(self, col, player):
+        """
+        Returns True if player would connect by dropping a piece in col, without changing the state.
+        """
+        row = self.board[col].index(0)
+        self.board[col][row] = player
+        wins = self.DoesMoveWin(col, row)
+        self.board[col][row] = 0
+        return wins
+
     def IsOnBoard(self, x, y):
         return 0 <= x < self.width and 0 <= y < self.height
 
@@ -95,6 +170,174 @@ class Connect4State(GameState):
         return s
 
 
+def HasLine(mask, shift, connect):
+    """
+    Returns a mask with a bit set at the start of every run of `connect` pieces
+    along the direction `shift`. Runs are found by doubling, so connect 4 needs two shifts.
+    """
+    run = 1
+    while run * 2 <= connect:
+        mask &= mask >> (shift * run)
+        run *= 2
+    if run < connect:
+        mask &= mask >> (shift * (connect - run))
+    return mask
+
+
+class BitboardConnect4State(Connect4State):
+    """
+    Connect4State backed by one integer bitmask per player plus the next free bit of each column.
+    Column x uses bits x * (height + 1) to x * (height + 1) + height - 1, the spare bit at the
+    top of every column stops shifted masks from wrapping into the neighbouring column.
+    The board attribute is rebuilt on demand so code reading state.board keeps working, once
+    built it is kept up to date by DoMove and UndoMove. Clone shares moveHistory with the copy
+    until one of them moves.
+    """
+
+    def InitializeBoard(self):
+        self.stride = self.height + 1
+        self.bitboards = [0, 0, 0]  # Indexed by player number, slot 0 is unused
+        self.heights = [col * self.stride for col in range(self.width)]
+        self.tops = [col * self.stride + self.height for col in range(self.width)]
+        self.shifts = (1, self.stride, self.stride - 1, self.stride + 1)  # Vertical, horizontal, both diagonals
+        self.moves = list(range(self.width))  # Columns that are not full yet
+        self._board = None
+        self._historyShared = False  # moveHistory is shared with a clone and copied before it changes
+
+    @property
+    def board(self):
+        if self._board is None:
+            board = [[0] * self.height for _ in range(self.width)]
+            for player in (1, 2):
+                mask = self.bitboards[player]
+                for col in range(self.width):
+                    for row in range(self.height):
+                        if mask >> (col * self.stride + row) & 1:
+                            board[col][row] = player
+            self._board = board
+        return self._board
+
+    def Clone(self):
+        st = object.__new__(type(self))
+        st.playerJustMoved = self.playerJustMoved
+        st.winner = self.winner
+        st.width = self.width
+        st.height = self.height
+        st.connect = self.connect
+        st.stride = self.stride
+        st.bitboards = self.bitboards[:]
+        st.heights = self.heights[:]
+        st.tops = self.tops
+        st.shifts = self.shifts
+        st.moves = self.moves[:]
+        st.moveHistory = self.moveHistory
+        st._historyShared = self._historyShared = True
+        st.zobristKeys = self.zobristKeys
+        st.zobristSide = self.zobristSide
+        st.hash = self.hash
+        st.mirrorHash = self.mirrorHash
+        st.evaluator = self.evaluator.Clone() if self.evaluator is not None else None
+        st._board = None
+        return st
+
+    def DoMove(self, movecol):
+        heights = self.heights
+        bit = heights[movecol]
+        assert 0 <= movecol < self.width and bit != self.tops[movecol]
+        player = self.playerJustMoved = 3 - self.playerJustMoved
+        mask = self.bitboards[player] | 1 << bit
+        self.bitboards[player] = mask
+        row = bit - self.stride * movecol
+        keys = self.zobristKeys[player]  # ToggleHash, inlined as DoMove is the hottest path
+        self.hash ^= keys[movecol * self.height + row]
+        self.mirrorHash ^= keys[(self.width - 1 - movecol) * self.height + row]
+        if self.evaluator is not None:
+            self.evaluator.Place(movecol, row, player)
+        if self._board is not None:
+            self._board[movecol][row] = player
+        heights[movecol] = bit + 1
+        if bit + 1 == self.tops[movecol]:
+            self.moves.remove(movecol)
+        if self._historyShared:
+            self.moveHistory = self.moveHistory[:]
+            self._historyShared = False
+        self.moveHistory.append((movecol, self.winner))
+        if self.IsWin(mask):
+            self.winner = player
+
+    def UndoMove(self):
+        """
+        Takes back the last move made with DoMove and returns its column.
+        """
+        if self._historyShared:
+            self.moveHistory = self.moveHistory[:]
+            self._historyShared = False
+        movecol, self.winner = self.moveHistory.pop()
+        if self.heights[movecol] == self.tops[movecol]:
+            insort(self.moves, movecol)
+        self.heights[movecol] -= 1
+        self.bitboards[self.playerJustMoved] ^= 1 << self.heights[movecol]
+        row = self.heights[movecol] - self.stride * movecol
+        self.ToggleHash(self.playerJustMoved, movecol, row)
+        if self.evaluator is not None:
+            self.evaluator.Remove(movecol, row, self.playerJustMoved)
+        if self._board is not None:
+            self._board[movecol][row] = 0
+        self.playerJustMoved = 3 - self.playerJustMoved
+        return movecol
+
+    def GetMoves(self):
+        if self.winner != 0:
+            return []
+        return self.moves[:]
+
+    def IsGameOver(self):
+        return self.winner != 0 or not self.moves
+
+    def IsWin(self, mask):
+        if self.connect == 4:
+            pairs = mask & (mask >> 1)  # Vertical
+            if pairs & (pairs >> 2):
+                return True
+            for shift in self.shifts[1:]:
+                pairs = mask & (mask >> shift)
+                if pairs & (pairs >> (2 * shift)):
+                    return True
+            return False
+        for shift in self.shifts:
+            if HasLine(mask, shift, self.connect):
+                return True
+        return False
+
+    def IsWinningMove(self, col, player):
+        return self.IsWin(self.bitboards[player] | 1 << self.heights[col])
+
+    def DoesMoveWin(self, x, y):
+        bit = 1 << (x * self.stride + y)
+        mask = self.bitboards[1] if self.bitboards[1] & bit else self.bitboards[2] if self.bitboards[2] & bit else 0
+        if mask == 0:
+            return False
+        if self.connect == 4:
+            for shift in self.shifts:
+                pairs = mask & (mask >> shift)
+                starts = pairs & (pairs >> (2 * shift))  # First cell of every line of four
+                cells = starts | starts << shift
+                if (cells | cells << (2 * shift)) & bit:  # All four cells of those lines
+                    return True
+            return False
+        for shift in self.shifts:
+            cells = HasLine(mask, shift, self.connect)
+            run = 1
+            while run * 2 <= self.connect:
+                cells |= cells << (shift * run)
+                run *= 2
+            if run < self.connect:
+                cells |= cells << (shift * (self.connect - run))
+            if cells & bit:
+                return True
+        return False
+
+
 def PrintGameResults(state):
     if state.winner != 0:
         if state.GetResult(state.playerJustMoved) == 1.0:
@@ -111,19 +354,19 @@ def PlayGame(initialState):
     state = initialState
     computational_budget = 10000  # Set a shared budget for both players
     player1 = Player1(computational_budget=computational_budget)
-    player2 = Player2(computational_budget=computational_budget)
-    while not state.IsGameOver():
-        print(str(state))
-        if state.playerJustMoved == 1:
-            move = player2.choose_move(state)
-        else:
-            move = player1.choose_move(state)
-        state.DoMove(move)
+    with Player2(computational_budget=computational_budget) as player2:
+        while not state.IsGameOver():
+            print(str(state))
+            if state.playerJustMoved == 1:
+                move = player2.choose_move(state)
+            else:
+                move = player1.choose_move(state)
+            state.DoMove(move)
     PrintGameResults(state)
 
 
 
 if __name__ == "__main__":
     colorama.init()
-    env = Connect4State(width=7, height=6)
+    env = BitboardConnect4State(width=7, height=6)
     PlayGame(env)
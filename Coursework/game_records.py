@@ -0,0 +1,255 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from multiprocessing import Pool
+from game_logic import BitboardConnect4State
+from tournament import ParseEngine, get_engine
+
+'''
+Self-play dataset generator and the packed file format it writes.
+A file is a small header followed by one variable-length record per game:
+flags (starting player, result, whether statistics follow), the number of plies, the moves
+packed a few bits each (3 bits on a 7 column board), and optionally per-move search statistics.
+Records are only ever appended, so a generator can be stopped and started again: a record cut
+short by a crash is ignored by the reader and cut off by the next writer before it appends. GameRecords reads a file through mmap, so
+iterating over millions of games never loads the file into memory.
+
+Run this file to generate games, for example:
+python game_records.py --games 10000 --output selfplay.c4g --stats
+'''
+
+HEADER = struct.Struct("<4sBBBBB")  # magic, version, width, height, connect, bits per move
+RECORD = struct.Struct("<BH")  # flags, plies
+STAT = struct.Struct("<If")  # nodes (Player1) or iterations (Player2), seconds
+MAGIC = b"C4GR"
+VERSION = 1
+
+STARTER_BIT = 0  # Bit 0: starting player - 1
+RESULT_SHIFT = 1  # Bits 1-2: winner, 0 for a draw
+STATS_FLAG = 1 << 3  # Bit 3: per-move statistics follow the moves
+
+
+def BitsPerMove(width):
+    return max(1, (width - 1).bit_length())
+
+
+def PackMoves(moves, bits):
+    packed = 0
+    for ply, move in enumerate(moves):
+        packed |= move << (ply * bits)
+    return packed.to_bytes((len(moves) * bits + 7) // 8, "little")
+
+
+def UnpackMoves(data, plies, bits):
+    packed = int.from_bytes(data, "little")
+    mask = (1 << bits) - 1
+    return [(packed >> (ply * bits)) & mask for ply in range(plies)]
+
+
+class GameRecordWriter:
+    """
+    Appends games to path, writing the header first when the file is new.
+    """
+
+    def __init__(self, path, width=7, height=6, connect=4):
+        self.path = path
+        self.bits = BitsPerMove(width)
+        self.games = 0  # Complete games in the file
+        header = HEADER.pack(MAGIC, VERSION, width, height, connect, self.bits)
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            with open(path, "rb") as f:
+                if f.read(HEADER.size) != header:
+                    raise ValueError(f"{path} holds games of another format or board size")
+            records = GameRecords(path)
+            self.games, end = records.CompleteLength()
+            records.Close()
+            self.file = open(path, "r+b")
+            self.file.truncate(end)  # Drop a last record cut short, so new games follow a complete one
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(header)
+
+    def Append(self, starter, winner, moves, stats=None):
+        """
+        :param starter: Player (1 or 2) who made the first move.
+        :param winner: 1, 2 or 0 for a draw.
+        :param moves: Columns played, in order.
+        :param stats: Optional (work, seconds) per move, work being nodes or iterations.
+        """
+        flags = (starter - 1) << STARTER_BIT | winner << RESULT_SHIFT | (STATS_FLAG if stats is not None else 0)
+        data = RECORD.pack(flags, len(moves)) + PackMoves(moves, self.bits)
+        if stats is not None:
+            data += b"".join(STAT.pack(min(int(work), 0xFFFFFFFF), seconds) for work, seconds in stats)
+        self.file.write(data)
+        self.games += 1
+
+    def Flush(self):
+        self.file.flush()
+
+    def Close(self):
+        self.file.close()
+
+
+class GameRecords:
+    """
+    Memory-mapped reader. Iterating yields (starter, winner, moves, stats) for every complete
+    game in the file, stats being None or a list of (work, seconds) per move.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.connect, self.bits = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} game record file")
+
+    def __iter__(self):
+        data, bits, end = self.data, self.bits, len(self.data)
+        offset = HEADER.size
+        while offset + RECORD.size <= end:
+            flags, plies = RECORD.unpack_from(data, offset)
+            movesStart = offset + RECORD.size
+            statsStart = movesStart + (plies * bits + 7) // 8
+            offset = statsStart + (plies * STAT.size if flags & STATS_FLAG else 0)
+            if offset > end:  # Last record cut short
+                return
+            stats = None
+            if flags & STATS_FLAG:
+                stats = [STAT.unpack_from(data, statsStart + ply * STAT.size) for ply in range(plies)]
+            yield ((flags >> STARTER_BIT & 1) + 1, flags >> RESULT_SHIFT & 3,
+                   UnpackMoves(data[movesStart:statsStart], plies, bits), stats)
+
+    def __len__(self):
+        return sum(1 for _ in self.Headers())
+
+    def CompleteLength(self):
+        """
+        Returns (games, bytes): the number of complete games and the file length up to the end of
+        the last of them.
+        """
+        data, bits, end = self.data, self.bits, len(self.data)
+        games, offset = 0, HEADER.size
+        while offset + RECORD.size <= end:
+            flags, plies = RECORD.unpack_from(data, offset)
+            recordEnd = offset + RECORD.size + (plies * bits + 7) // 8 + (plies * STAT.size if flags & STATS_FLAG else 0)
+            if recordEnd > end:
+                break
+            games, offset = games + 1, recordEnd
+        return games, offset
+
+    def Headers(self):
+        """
+        Yields (starter, winner, plies) without decoding moves or statistics, for fast scans.
+        """
+        data, bits, end = self.data, self.bits, len(self.data)
+        offset = HEADER.size
+        while offset + RECORD.size <= end:
+            flags, plies = RECORD.unpack_from(data, offset)
+            offset += RECORD.size + (plies * bits + 7) // 8 + (plies * STAT.size if flags & STATS_FLAG else 0)
+            if offset > end:
+                return
+            yield (flags >> STARTER_BIT & 1) + 1, flags >> RESULT_SHIFT & 3, plies
+
+    def Replay(self, starter, moves):
+        """
+        Returns the BitboardConnect4State reached by playing moves, for example to label positions.
+        """
+        state = BitboardConnect4State(self.width, self.height, self.connect)
+        state.playerJustMoved = 3 - starter
+        for move in moves:
+            state.DoMove(move)
+        return state
+
+    def Close(self):
+        self.data.close()
+
+
+def play_selfplay_game(args):
+    """
+    Plays one game and returns (starter, winner, moves, stats). The engines swap sides every game
+    and the starting player alternates every two games, so all four combinations come up.
+    The first `random_plies` moves are random to spread the games over more openings.
+    """
+    game_id, engineA, engineB, random_plies, seed = args
+    random.seed(f"{seed}-{game_id}")
+    players = {}
+    for piece, engine in zip((1, 2) if game_id % 2 == 0 else (2, 1), (engineA, engineB)):
+        players[piece] = get_engine(engine)  # Kept by the worker process between games
+
+    state = BitboardConnect4State()
+    starter = 1 if game_id // 2 % 2 == 0 else 2
+    state.playerJustMoved = 3 - starter
+    moves, stats = [], []
+    while not state.IsGameOver():
+        if len(moves) < random_plies:
+            move = random.choice(state.GetMoves())
+            stats.append((0, 0.0))
+        else:
+            player = players[3 - state.playerJustMoved]
+            move = player.choose_move(state)
+            stats.append((player.move_stats.get("nodes", player.move_stats.get("iterations", 0)), player.move_stats["time"]))
+        state.DoMove(move)
+        moves.append(move)
+    return starter, state.winner, moves, stats
+
+
+def GenerateGames(path, games, engineA, engineB, random_plies=2, keep_stats=False, processes=None, seed=0):
+    """
+    Appends `games` self-play games to path. Game ids continue after the games already in the file,
+    so running the generator again adds new games instead of repeating the old ones.
+    Returns the number of games in the file.
+    """
+    writer = GameRecordWriter(path)
+    existing = writer.games
+    tasks = [(existing + i, engineA, engineB, random_plies, seed) for i in range(games)]
+    start_time = time.time()
+    try:
+        with Pool(processes) as pool:
+            for done, (starter, winner, moves, stats) in enumerate(pool.imap_unordered(play_selfplay_game, tasks, 8), 1):
+                writer.Append(starter, winner, moves, stats if keep_stats else None)
+                if done % 100 == 0 or done == games:
+                    writer.Flush()
+                    print(f"Games: {done}/{games} ({done / (time.time() - start_time):.2f} games/s)")
+            pool.close()  # Let the workers exit normally so they close their engines
+            pool.join()
+    finally:
+        writer.Close()
+    return existing + games
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate self-play games in the packed game record format.")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--output", default="selfplay.c4g")
+    parser.add_argument("--engine", action="append", metavar="NAME=CLASS:ARGS",
+                        help="the two engines, as in tournament.py (default Player1 against Player2 at budget 1000)")
+    parser.add_argument("--random-plies", type=int, default=2, help="random moves at the start of every game")
+    parser.add_argument("--stats", action="store_true", help="store per-move search statistics")
+    parser.add_argument("--processes", type=int, help="worker processes, one per core by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--summary", metavar="FILE", help="only print a summary of an existing file")
+    args = parser.parse_args()
+
+    if args.summary:
+        records = GameRecords(args.summary)
+        results = {0: 0, 1: 0, 2: 0}
+        plies = 0
+        for starter, winner, length in records.Headers():
+            results[winner] += 1
+            plies += length
+        games = sum(results.values())
+        print(f"{games} games, {plies} plies, {os.path.getsize(args.summary) / max(games, 1):.1f} bytes per game")
+        print(f"Player 1 wins: {results[1]}  Player 2 wins: {results[2]}  Draws: {results[0]}")
+    else:
+        specs = args.engine or ["minimax=Player1:computational_budget=1000", "mcts=Player2:computational_budget=1000"]
+        if len(specs) != 2:
+            parser.error("give exactly two engines")
+        engineA, engineB = [ParseEngine(spec) for spec in specs]
+        total = GenerateGames(args.output, args.games, engineA, engineB, args.random_plies, args.stats,
+                              args.processes, args.seed)
+        print(f"{args.output} now holds {total} games")
@@ -0,0 +1,224 @@
+import random
+import sys
+from math import sqrt, log
+
+
+def LeaderSettled(children, untried, remaining):
+    """
+    Returns True when the most visited child can not be overtaken in visits by `remaining` more
+    visits, and is also the child with the best win rate, so stopping now plays the move the search
+    has been concentrating on. Moves not expanded yet count as children with no visits.
+    :param children: (wins, visits) of every expanded child.
+    :param untried: Number of moves not expanded yet.
+    """
+    if remaining <= 0:
+        return True
+    if not children:
+        return False
+    visits = sorted((visits for _, visits in children), reverse=True) + [0] * untried
+    if len(visits) > 1 and visits[0] - visits[1] <= remaining:
+        return False
+    leader = max(children, key=lambda child: child[1])
+    return leader[0] / leader[1] >= max(wins / visits for wins, visits in children)
+
+
+class ArrayTree:
+    """
+    MCTS tree kept in preallocated parallel lists instead of one Node object per position.
+    A node is an integer index, children of a node form a linked list through firstChild and
+    nextSibling, and untried moves are a bitmask of columns.
+    Note: wins[node] is from the perspective of playerJustMoved[node], as in Node.
+
+    The tree never holds more than max_nodes nodes. Once it is full, expansion stops:
+    the remaining iterations still select down to a leaf, roll out from it and back up
+    the result, so statistics keep improving but the tree does not grow.
+    """
+
+    def __init__(self, max_nodes):
+        self.max_nodes = max_nodes
+        self.move = [-1] * max_nodes
+        self.parent = [-1] * max_nodes
+        self.firstChild = [-1] * max_nodes
+        self.nextSibling = [-1] * max_nodes
+        self.visits = [0] * max_nodes
+        self.wins = [0] * max_nodes
+        self.untried = [0] * max_nodes
+        self.playerJustMoved = [0] * max_nodes
+        self.depth = [0] * max_nodes  # Distance from the root
+        self.size = 0
+        self.maxDepth = 0
+
+    def IsFull(self):
+        return self.size >= self.max_nodes
+
+    def AddNode(self, move, parent, state):
+        """
+        Adds a node for state reached by move from parent (-1 for the root) and returns its index.
+        New children are put at the front of the parent's child list.
+        """
+        node = self.size
+        self.size += 1
+        self.move[node] = move
+        self.parent[node] = parent
+        self.firstChild[node] = -1
+        self.visits[node] = 0
+        self.wins[node] = 0
+        untried = 0
+        for m in state.GetMoves():
+            untried |= 1 << m
+        self.untried[node] = untried
+        self.playerJustMoved[node] = state.playerJustMoved
+        if parent != -1:
+            self.nextSibling[node] = self.firstChild[parent]
+            self.firstChild[parent] = node
+            self.untried[parent] &= ~(1 << move)
+            depth = self.depth[node] = self.depth[parent] + 1
+            if depth > self.maxDepth:
+                self.maxDepth = depth
+        else:
+            self.nextSibling[node] = -1
+            self.depth[node] = 0
+        return node
+
+    def Children(self, node):
+        """
+        Returns the indices of the children of node, most recently added first.
+        """
+        children = []
+        child = self.firstChild[node]
+        while child != -1:
+            children.append(child)
+            child = self.nextSibling[child]
+        return children
+
+    def Select(self, node, state, exploration_constant=sqrt(2)):
+        """
+        Walks down from node choosing the child with the highest UCB1 value until it reaches a node
+        that still has untried moves or no children, playing the moves on state on the way.
+        """
+        visits, wins, move = self.visits, self.wins, self.move
+        firstChild, nextSibling, untried = self.firstChild, self.nextSibling, self.untried
+        while untried[node] == 0 and firstChild[node] != -1:
+            logVisits = log(visits[node])
+            best = -1
+            bestValue = -float('inf')
+            child = firstChild[node]
+            while child != -1:
+                value = wins[child] / visits[child] + exploration_constant * sqrt(logVisits / visits[child])
+                if value > bestValue:
+                    best = child
+                    bestValue = value
+                child = nextSibling[child]
+            node = best
+            state.DoMove(move[node])
+        return node
+
+    def Expand(self, node, state):
+        """
+        Adds a child of node for a random untried move and plays it on state.
+        Returns node itself when it has no untried moves or the tree is full.
+        """
+        untried = self.untried[node]
+        if untried == 0 or self.size >= self.max_nodes:
+            return node
+        moves = [m for m in range(untried.bit_length()) if untried >> m & 1]
+        move = random.choice(moves)
+        state.DoMove(move)
+        return self.AddNode(move, node, state)
+
+    def Backpropagate(self, node, state):
+        """
+        Adds the result of the finished game in state to node and all of its ancestors.
+        """
+        visits, wins, parent, playerJustMoved = self.visits, self.wins, self.parent, self.playerJustMoved
+        while node != -1:
+            visits[node] += 1
+            wins[node] += state.GetResult(playerJustMoved[node])
+            node = parent[node]
+
+    def BackpropagateBatch(self, node, counts):
+        """
+        Backs up a batch of rollouts in one step.
+        :param counts: [draws, player 1 wins, player 2 wins] as returned by BatchRollout.
+        """
+        playouts = int(counts[0] + counts[1] + counts[2])
+        results = (0, int(counts[1]), int(counts[2]))
+        visits, wins, parent, playerJustMoved = self.visits, self.wins, self.parent, self.playerJustMoved
+        while node != -1:
+            visits[node] += playouts
+            wins[node] += results[playerJustMoved[node]]
+            node = parent[node]
+
+    def BestMove(self, node):
+        """
+        Returns the move of the child of node with the highest win rate.
+        """
+        best = -1
+        bestRate = -float('inf')
+        child = self.firstChild[node]
+        while child != -1:
+            rate = self.wins[child] / self.visits[child]
+            if rate > bestRate:
+                best = child
+                bestRate = rate
+            child = self.nextSibling[child]
+        return self.move[best]
+
+    def BestMoveSettled(self, node, remaining):
+        """
+        Returns True when `remaining` more visits below node can not take the lead in visits away from
+        the child BestMove(node) returns, see LeaderSettled.
+        """
+        children = [(self.wins[child], self.visits[child]) for child in self.Children(node)]
+        return LeaderSettled(children, bin(self.untried[node]).count("1"), remaining)
+
+    def Extract(self, node, max_nodes=None):
+        """
+        Returns a new ArrayTree holding only the subtree below node, with node as its root (index 0).
+        Used to keep a subtree between moves without keeping the rest of the old tree alive.
+        """
+        tree = ArrayTree(max_nodes if max_nodes is not None else self.max_nodes)
+        mapping = {node: 0}
+        order = [node]
+        for old in order:  # Breadth first, order grows while it is walked
+            order.extend(reversed(self.Children(old)))
+        for old in order[:tree.max_nodes]:
+            new = tree.size
+            tree.size += 1
+            mapping[old] = new
+            tree.move[new] = self.move[old]
+            tree.visits[new] = self.visits[old]
+            tree.wins[new] = self.wins[old]
+            tree.untried[new] = self.untried[old]
+            tree.playerJustMoved[new] = self.playerJustMoved[old]
+            parent = mapping[self.parent[old]] if old != node else -1
+            tree.parent[new] = parent
+            if parent != -1:
+                tree.nextSibling[new] = tree.firstChild[parent]
+                tree.firstChild[parent] = new
+                tree.depth[new] = tree.depth[parent] + 1
+        tree.maxDepth = tree.depth[tree.size - 1]  # Breadth first, so the last node is a deepest one
+        return tree
+
+    def MaxDepth(self):
+        """
+        Returns the depth of the deepest node below the root (index 0), kept up to date by AddNode.
+        """
+        return self.maxDepth
+
+    def Lists(self):
+        return (self.move, self.parent, self.firstChild, self.nextSibling, self.visits, self.wins, self.untried,
+                self.playerJustMoved, self.depth)
+
+    def MemoryBytes(self):
+        """
+        Returns the memory held by the preallocated lists (the small ints they point to are shared).
+        """
+        return sum(sys.getsizeof(array) for array in self.Lists())
+
+    def UsedBytes(self):
+        """
+        Returns the memory of the list slots holding the tree's nodes: one pointer per list for each
+        of the size nodes. Unlike MemoryBytes it grows with the tree rather than with max_nodes.
+        """
+        return self.size * len(self.Lists()) * (sys.getsizeof([None]) - sys.getsizeof([]))
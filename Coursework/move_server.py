@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import json
+import socket
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+from game_logic import BitboardConnect4State
+from tournament import ParseEngine, PLAYERS
+
+'''
+Long running move server: front-ends send positions as move sequences and get moves back, while
+the engines stay loaded (with their transposition tables, solver tables and opening books) in a
+pool of worker processes. The protocol is one JSON object per line over a Unix socket or a
+localhost TCP port:
+
+    {"id": 1, "moves": [3, 3, 4], "engine": "mcts", "time_limit": 0.5}
+    -> {"id": 1, "move": 2, "elapsed": 0.51, "queued": 0.001}
+    {"op": "stats"}
+    -> {"queue_depth": 0, "in_flight": 0, "requests": 1, "latency": {...}, "queued": {...}}
+
+"moves" may also be a string of digits, "first" (default 1) is the player who made the first move
+and "engine" defaults to the first engine given. "time_limit" counts from the request's arrival, a
+request still queued when it runs out gets a quick win/block/centre move ("expired": true). Start a
+server with for example:
+python move_server.py --socket /tmp/connect4.sock --engine mcts=Player2:computational_budget=5000
+'''
+
+_engines = {}  # name -> (player, its constructor arguments), built once in each worker process
+
+
+def init_engines(engines):
+    """
+    Worker initializer: builds every engine once so requests never pay for start-up.
+    """
+    for name, kind, kwargs in engines:
+        _engines[name] = (PLAYERS[kind](**kwargs), kwargs)
+    util.Finalize(None, close_engines, exitpriority=10)  # When the worker exits
+
+
+def close_engines():
+    for player, _ in _engines.values():
+        if hasattr(player, "Close"):
+            player.Close()
+    _engines.clear()
+
+
+def MakeState(moves, first=1):
+    state = BitboardConnect4State()
+    state.playerJustMoved = 3 - first
+    for move in moves:
+        if state.IsGameOver() or move not in state.GetMoves():
+            raise ValueError(f"Illegal move {move} in {list(moves)}")
+        state.DoMove(move)
+    if state.IsGameOver():
+        raise ValueError("The game is already over")
+    return state
+
+
+def QuickMove(state):
+    """
+    Move for a request with no search time: a winning move, else a move
+    that blocks the opponent's immediate win, else the most central column.
+    """
+    moves = sorted(state.GetMoves(), key=lambda col: abs(col - state.width // 2))
+    for player in (3 - state.playerJustMoved, state.playerJustMoved):
+        for move in moves:
+            child = state.Clone()
+            child.playerJustMoved = 3 - player  # Drop a piece of `player` in the column
+            child.DoMove(move)
+            if child.winner == player:
+                return move
+    return moves[0]
+
+
+def ChooseMove(name, state, remaining):
+    """
+    Asks engine name for a move in state within `remaining` seconds (None for no limit).
+    Player1 searches with iterative deepening up to the time left, MCTS stops at the time left
+    or its iteration budget, whichever comes first.
+    """
+    player, kwargs = _engines[name]
+    if hasattr(player, "iterative_deepening"):
+        player.iterative_deepening = remaining is not None or kwargs.get("iterative_deepening", False)
+    default = kwargs.get("time_limit")
+    player.time_limit = remaining if default is None or remaining is not None and remaining < default else default
+    return player.choose_move(state)
+
+
+def ExpiredReply(moves, first):
+    """
+    Reply to a request whose time ran out before a search could start.
+    """
+    try:
+        return {"move": QuickMove(MakeState(moves, first)), "expired": True}
+    except Exception as error:
+        return {"error": str(error)}
+
+
+def serve_batch(requests):
+    """
+    Runs a batch of requests in one worker, one after another. Every request is
+    (engine name, moves, first, deadline) with deadline a time.time() or None, and gets back
+    {"move": ...} or {"error": ...}. Each search gets the time left to its own deadline, shared
+    with the requests after it in the batch so they still have time of their own when it finishes.
+    """
+    replies = []
+    for index, (name, moves, first, deadline) in enumerate(requests):
+        now = time.time()
+        if deadline is not None and deadline <= now:
+            replies.append(ExpiredReply(moves, first))
+            continue
+        shares = [(later - now) / (position + 1) for position, (_, _, _, later) in enumerate(requests[index:])
+                  if later is not None]
+        try:
+            replies.append({"move": ChooseMove(name, MakeState(moves, first), min(shares) if shares else None)})
+        except Exception as error:
+            replies.append({"error": str(error)})
+    return replies
+
+
+class MoveServer:
+    """
+    Accepts requests from any number of connections and batches the ones that arrive within
+    batch_window seconds of each other (at most max_batch). A batch is spread over every free
+    worker process, so requests arriving together are searched side by side. Requests wait in
+    a queue while every worker is busy, and are answered without a search if their time runs out there.
+    """
+
+    def __init__(self, engines, workers=1, batch_window=0.005, max_batch=16, default_time_limit=None):
+        self.engines = engines
+        self.names = [engine[0] for engine in engines]
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.default_time_limit = default_time_limit
+        self.executor = ProcessPoolExecutor(workers, initializer=init_engines, initargs=(engines,))
+        self.queue = asyncio.Queue()
+        self.waiting = set()  # Futures of the requests not handed to a worker or answered yet
+        self.slots = asyncio.Semaphore(workers)  # One batch per worker at a time
+        self.in_flight = 0
+        self.requests = 0
+        self.batches = 0
+        self.expired = 0
+        self.latencies = deque(maxlen=1000)  # Seconds from arrival to reply of the latest requests
+        self.waits = deque(maxlen=1000)  # Seconds the same requests waited for a worker
+
+    async def Warm(self):
+        """
+        Starts every worker process (building its engines) before the first request arrives.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, serve_batch, []) for _ in range(self.workers)])
+
+    def Expire(self, entry):
+        """
+        Answers a request whose deadline passed before it was handed to a worker.
+        """
+        (_, moves, first, _), arrived, future = entry
+        if future not in self.waiting:
+            return  # Already running or answered
+        self.waiting.discard(future)
+        self.expired += 1
+        reply = ExpiredReply(moves, first)
+        reply["queued"] = reply["elapsed"] = time.time() - arrived
+        self.latencies.append(reply["elapsed"])
+        future.set_result(reply)
+
+    async def Batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            closes = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                timeout = closes - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            free = 1
+            while free < len(batch) and not self.slots.locked():  # Every other idle worker as well
+                await self.slots.acquire()
+                free += 1
+            batch = [entry for entry in batch if entry[2] in self.waiting]  # Skip the ones that expired
+            used = min(free, len(batch))
+            for _ in range(free - used):
+                self.slots.release()
+            if not batch:
+                continue
+            for entry in batch:
+                self.waiting.discard(entry[2])
+            self.in_flight += len(batch)
+            for worker in range(used):
+                self.batches += 1
+                asyncio.ensure_future(self.RunBatch(batch[worker::used]))
+
+    async def RunBatch(self, batch):
+        loop = asyncio.get_running_loop()
+        started = time.time()
+        try:
+            replies = await loop.run_in_executor(self.executor, serve_batch, [job for job, _, _ in batch])
+        except Exception as error:  # A worker died, fail the whole batch
+            replies = [{"error": str(error)} for _ in batch]
+        finally:
+            self.slots.release()
+            self.in_flight -= len(batch)
+        for (job, arrived, future), reply in zip(batch, replies):
+            reply["queued"] = started - arrived
+            reply["elapsed"] = time.time() - arrived
+            self.waits.append(reply["queued"])
+            self.latencies.append(reply["elapsed"])
+            future.set_result(reply)
+
+    def Stats(self):
+        def percentiles(values):
+            values = sorted(values)
+
+            def percentile(percent):
+                return values[max(0, -(-percent * len(values) // 100) - 1)] if values else 0
+
+            return {"p50": percentile(50), "p95": percentile(95), "p99": percentile(99)}
+
+        return {"queue_depth": len(self.waiting), "in_flight": self.in_flight, "requests": self.requests,
+                "batches": self.batches, "expired": self.expired,
+                "latency": percentiles(self.latencies), "queued": percentiles(self.waits)}
+
+    async def Handle(self, request):
+        if not isinstance(request, dict):
+            raise TypeError("a request must be a JSON object")
+        if request.get("op") == "stats":
+            return self.Stats()
+        moves = request.get("moves", [])
+        if isinstance(moves, str):
+            moves = [int(move) for move in moves]
+        name = request.get("engine", self.names[0])
+        if name not in self.names:
+            return {"error": f"Unknown engine {name!r}, available: {self.names}"}
+        time_limit = request.get("time_limit", self.default_time_limit)
+        arrived = time.time()
+        deadline = arrived + time_limit if time_limit is not None else None
+        self.requests += 1
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = ((name, moves, request.get("first", 1), deadline), arrived, future)
+        self.waiting.add(future)
+        await self.queue.put(entry)
+        if deadline is not None:
+            loop.call_later(max(0.0, deadline - time.time()), self.Expire, entry)
+        return await future
+
+    async def Connection(self, reader, writer):
+        """
+        Serves one client. Requests on a connection are handled concurrently and answered as they
+        finish, with their "id" echoed so the client can match them up.
+        """
+        lock = asyncio.Lock()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+                reply = await self.Handle(request)
+                if "id" in request:
+                    reply = dict(reply, id=request["id"])
+            except (ValueError, TypeError) as error:
+                reply = {"error": f"Bad request: {error}"}
+            async with lock:
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+
+        tasks = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks, return_exceptions=True)
+        writer.close()
+
+    async def Serve(self, path=None, port=None):
+        await self.Warm()
+        batcher = asyncio.ensure_future(self.Batcher())
+        if path is not None:
+            server = await asyncio.start_unix_server(self.Connection, path)
+        else:
+            server = await asyncio.start_server(self.Connection, "127.0.0.1", port)
+        print(f"Serving {self.names} on {path or f'127.0.0.1:{port}'} with {self.workers} worker(s)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.executor.shutdown()
+
+
+def RequestMove(moves, path=None, port=None, **fields):
+    """
+    Small blocking client: sends one request and returns the reply as a dict.
+    Extra keyword arguments (engine, time_limit, first) are passed on in the request.
+    """
+    if path is not None:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(path)
+    else:
+        connection = socket.create_connection(("127.0.0.1", port))
+    with connection, connection.makefile("rw") as stream:
+        stream.write(json.dumps(dict(fields, moves=moves)) + "\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Connect 4 moves to local clients.")
+    parser.add_argument("--engine", action="append", metavar="NAME=CLASS:ARGS",
+                        help="engine to serve, as in tournament.py (default: mcts=Player2:computational_budget=1000)")
+    parser.add_argument("--socket", help="Unix socket path to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="localhost TCP port when no --socket is given")
+    parser.add_argument("--workers", type=int, default=1, help="engine processes")
+    parser.add_argument("--batch-window", type=float, default=0.005, help="seconds to wait for requests to batch together")
+    parser.add_argument("--max-batch", type=int, default=16, help="most requests in one batch")
+    parser.add_argument("--time-limit", type=float, help="default seconds per request, counted from its arrival")
+    args = parser.parse_args()
+
+    engines = [ParseEngine(spec) for spec in (args.engine or ["mcts=Player2:computational_budget=1000"])]
+    server = MoveServer(engines, args.workers, args.batch_window, args.max_batch, args.time_limit)
+    try:
+        asyncio.run(server.Serve(args.socket, None if args.socket else args.port))
+    except KeyboardInterrupt:
+        pass
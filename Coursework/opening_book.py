@@ -0,0 +1,169 @@
+import argparse
+import mmap
+import struct
+import time
+from evaluation import WindowEvaluator
+
+'''
+Builds an opening book offline and looks positions up in it.
+The book is a sorted array of fixed-size records (canonical position key, best move, flags, score)
+after a small header, so players binary search it straight from a memory-mapped file:
+nothing is parsed at start-up and all worker processes share the same pages.
+
+Run this file to build a book, for example:
+python opening_book.py --plies 4 --depth 6 --output book.bin
+'''
+
+HEADER = struct.Struct("<4sBBBBI")  # magic, version, width, height, connect, record count
+RECORD = struct.Struct("<QBBh")  # canonical key, best move in canonical orientation, flags, score for the side to move
+MAGIC = b"C4BK"
+VERSION = 2
+
+SOLVED = 1  # Flag: the score is an exact solver result, result * (1000 - distance), not a heuristic score
+
+_openBooks = {}  # path -> OpeningBook, so every process maps a book once
+
+
+class OpeningBook:
+    """
+    Read-only view of a book file. Keys come from Connect4State.CanonicalHash, so on boards of odd
+    width a position and its mirror image share one record and the stored move is flipped back
+    when needed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.connect, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def Open(cls, path):
+        if path not in _openBooks:
+            _openBooks[path] = cls(path)
+        return _openBooks[path]
+
+    def Find(self, key):
+        """
+        Binary searches the records for key and returns (move, score, solved) in canonical orientation or None.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            recordKey, move, flags, score = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+            if recordKey < key:
+                low = middle + 1
+            elif recordKey > key:
+                high = middle
+            else:
+                return move, score, bool(flags & SOLVED)
+        return None
+
+    def Lookup(self, state):
+        """
+        Returns (move, score, solved) for state, score from the side to move's point of view and solved
+        True when it is an exact solver result, or None when the position is not in the book or the
+        book was built for another board size.
+        """
+        if (state.width, state.height, state.connect) != (self.width, self.height, self.connect):
+            return None
+        key, mirrored = state.CanonicalHash()
+        entry = self.Find(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        move, score, solved = entry
+        return (state.width - 1 - move if mirrored else move), score, solved
+
+
+def SearchPosition(state, depth, player, solver):
+    """
+    Returns (best move, score for the side to move, solved) from an exact solve when the position
+    is small enough, otherwise from a fixed-depth search with the Player1 evaluation.
+    """
+    if solver.CanSolve(state):
+        move, result, distance = solver.BestMove(state)
+        return move, result * (1000 - distance), True
+    toMove = 3 - state.playerJustMoved
+    bestMove, bestScore = None, None
+    for move in state.GetMoves():
+        child = state.Clone()
+        child.evaluator = WindowEvaluator.FromState(child)
+        child.DoMove(move)
+        # Minimax scores are from Player 1's point of view, player 1 maximises
+        score = player.Minimax(child, depth - 1, -float('inf'), float('inf'), maximizingPlayer=(toMove == 2))
+        score = score if toMove == 1 else -score
+        if bestScore is None or score > bestScore:
+            bestMove, bestScore = move, score
+    return bestMove, bestScore, False
+
+
+def BuildBook(path, plies, depth, width=7, height=6, connect=4, starters=(1, 2), progress=True):
+    """
+    Searches every position reachable in at most `plies` moves (for each starting player) and
+    writes the book to path. Returns the number of positions stored. Transpositions (and, on odd
+    widths, mirror images) are merged as they are generated, so each ply's frontier holds every position once.
+    """
+    from game_logic import BitboardConnect4State
+    from Player1 import Player1
+    from solver import Solver
+
+    player = Player1(computational_budget=float('inf'), endgame_cells=0)
+    solver = Solver()
+    entries = {}
+    frontier = []
+    seen = set()  # Canonical keys of every position put in a frontier
+    for starter in starters:
+        state = BitboardConnect4State(width, height, connect)
+        state.playerJustMoved = 3 - starter
+        key = state.CanonicalHash()[0]
+        if key not in seen:
+            seen.add(key)
+            frontier.append(state)
+
+    start_time = time.time()
+    for ply in range(plies + 1):
+        nextFrontier = []
+        for state in frontier:
+            key, mirrored = state.CanonicalHash()
+            if state.GetMoves() == []:
+                continue
+            move, score, solved = SearchPosition(state, depth, player, solver)
+            entries[key] = (width - 1 - move if mirrored else move, SOLVED if solved else 0,
+                            max(-32768, min(32767, int(score))))
+            if ply < plies:
+                for nextMove in state.GetMoves():
+                    child = state.Clone()
+                    child.DoMove(nextMove)
+                    childKey = child.CanonicalHash()[0]
+                    if childKey not in seen:
+                        seen.add(childKey)
+                        nextFrontier.append(child)
+        frontier = nextFrontier
+        if progress:
+            print(f"Ply {ply}: {len(entries)} positions ({time.time() - start_time:.1f}s)")
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, width, height, connect, len(entries)))
+        for key in sorted(entries):
+            move, flags, score = entries[key]
+            f.write(RECORD.pack(key, move, flags, score))
+    return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a Connect 4 opening book.")
+    parser.add_argument("--plies", type=int, default=4, help="book positions up to this many moves into the game")
+    parser.add_argument("--depth", type=int, default=6, help="search depth used to score each position")
+    parser.add_argument("--output", default="book.bin")
+    parser.add_argument("--width", type=int, default=7)
+    parser.add_argument("--height", type=int, default=6)
+    parser.add_argument("--connect", type=int, default=4)
+    args = parser.parse_args()
+    count = BuildBook(args.output, args.plies, args.depth, args.width, args.height, args.connect)
+    print(f"Wrote {count} positions to {args.output}")
@@ -0,0 +1,74 @@
+import os
+import random
+import time
+from math import sqrt
+from multiprocessing import Pool
+from Player2 import MCTS_UCT_Array, rollout_phase, decisive_rollout_phase
+from mcts_tree import ArrayTree
+
+'''
+Root parallel MCTS: one move decision is searched by several independent trees in worker
+processes and their root statistics are merged. Run this file to see how iterations per
+second scale with the number of worker processes on this machine.
+'''
+
+
+def search_root_worker(args):
+    """
+    Runs one independent MCTS search and returns (move, visits, wins) for every root child.
+    """
+    rootstate, itermax, exploration_factor_ucb1, seed, batch_rollouts, decisive_rollouts, time_limit = args
+    random.seed(seed)
+    tree = ArrayTree(itermax + 1 if itermax != float('inf') else 1 << 16)
+    tree.AddNode(None, -1, rootstate)
+    MCTS_UCT_Array(rootstate, itermax, exploration_factor_ucb1, tree=tree, batch_rollouts=batch_rollouts,
+                   rollout_policy=decisive_rollout_phase if decisive_rollouts else rollout_phase, time_limit=time_limit)
+    return [(tree.move[child], tree.visits[child], tree.wins[child]) for child in tree.Children(0)]
+
+
+def RootParallelMCTS(rootstate, itermax, pool, workers, exploration_factor_ucb1=sqrt(2), batch_rollouts=0,
+                     decisive_rollouts=False, time_limit=None):
+    """
+    Splits itermax iterations over `workers` independent trees searched in pool, adds up the
+    visits and wins of each root move over all trees and returns the move with the best win rate.
+    With time_limit every tree also stops after that many seconds, itermax may then be float('inf').
+
+    :returns: (move, merged) where merged maps each root move to [visits, wins].
+    """
+    share, extra = divmod(itermax, workers) if itermax != float('inf') else (itermax, 0)
+    jobs = [(rootstate, share + (1 if i < extra else 0), exploration_factor_ucb1, random.getrandbits(32), batch_rollouts,
+             decisive_rollouts, time_limit) for i in range(workers)]
+    merged = {}
+    for children in pool.map(search_root_worker, [job for job in jobs if job[1] > 0]):
+        for move, visits, wins in children:
+            totals = merged.setdefault(move, [0, 0])
+            totals[0] += visits
+            totals[1] += wins
+    move = max(merged, key=lambda m: merged[m][1] / merged[m][0])
+    return move, merged
+
+
+def MeasureScaling(state, itermax, worker_counts):
+    """
+    Times one root parallel decision of itermax iterations for each worker count.
+    Returns {workers: iterations per second}.
+    """
+    scaling = {}
+    for workers in worker_counts:
+        with Pool(workers) as pool:
+            pool.map(abs, range(workers))  # Start the processes before timing
+            start_time = time.time()
+            RootParallelMCTS(state, itermax, pool, workers)
+            scaling[workers] = itermax / (time.time() - start_time)
+    return scaling
+
+
+if __name__ == "__main__":
+    from game_logic import BitboardConnect4State
+
+    budget = 10000
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    scaling = MeasureScaling(BitboardConnect4State(), budget, worker_counts)
+    for workers, rate in scaling.items():
+        print(f"Workers: {workers}  Iterations/s: {rate:.0f}  Speedup: {rate / scaling[1]:.2f}x")
@@ -0,0 +1,257 @@
+import json
+import math
+import os
+import sys
+
+'''
+Streaming results log for simulate_games.py: every finished game is appended to a JSONL file
+as soon as it completes, so a crashed run keeps what it finished and can be resumed.
+Run this file on a log to recompute the report without replaying any games:
+python results_log.py results.jsonl
+'''
+
+
+class ResultsLog:
+    """
+    Appends one JSON line per game to path and knows which games are already recorded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def Records(self):
+        """
+        Yields the records in the log in the order they were written. A last line cut short by a
+        crash is skipped.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def DropPartialLine(self):
+        """
+        Truncates a last line without its newline, left by a killed run, so the next record starts
+        on a line of its own. Records skips such a line, so a resumed run plays its game again.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:  # Search backwards for the last newline
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+
+    def Append(self, record):
+        if self.file is None:
+            self.DropPartialLine()
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def Close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ResultsAggregator:
+    """
+    Keeps running totals per budget so metrics are available at any point of a run.
+    Records are game results as returned by simulate_single_game and may arrive in any order,
+    win streaks are still counted in game id order so they do not depend on scheduling.
+    """
+
+    def __init__(self):
+        self.totals = {}
+
+    def Add(self, record):
+        totals = self.totals.setdefault(record["budget"], {
+            "games": 0,
+            "wins": {1: 0, 2: 0, 0: 0},  # 0 counts draws
+            "moves": {1: 0, 2: 0, 0: 0},  # Total game length by outcome
+            "player_moves": {1: 0, 2: 0},
+            "player_time": {1: 0, 2: 0},
+            "longest_streak": {1: 0, 2: 0},
+            "current_streak": {1: 0, 2: 0},
+            "next_game": 0,  # Streaks have been counted for every game id below this
+            "pending": {},  # game id -> outcome of games that finished ahead of an earlier one
+            "tt": {},
+            "move_times": {1: [], 2: []},  # Seconds per move, for latency percentiles
+            "search": {1: {}, 2: {}},  # Sums of the numeric per-move search statistics
+            "searched_moves": {1: 0, 2: 0},  # Moves with search statistics (older logs have none)
+        })
+        outcome = record["winner"]
+        if outcome not in [1, 2, 0]:  # Handle unexpected outcomes
+            print(f"Unexpected outcome: {outcome}. Defaulting to Draw.")
+            outcome = 0
+
+        totals["games"] += 1
+        totals["wins"][outcome] += 1
+        totals["moves"][outcome] += record["moves"]
+        for player in (1, 2):
+            totals["player_moves"][player] += record["player_moves"][player - 1]
+            totals["player_time"][player] += record["player_time"][player - 1]
+        totals["pending"][record["game_id"]] = outcome
+        while totals["next_game"] in totals["pending"]:
+            self.CountStreak(totals["longest_streak"], totals["current_streak"], totals["pending"].pop(totals["next_game"]))
+            totals["next_game"] += 1
+        for name, count in record.get("tt", {}).items():
+            totals["tt"][name] = totals["tt"].get(name, 0) + count
+        for player, moves in zip((1, 2), record.get("move_stats", [[], []])):
+            search = totals["search"][player]
+            for stats in moves:
+                totals["move_times"][player].append(stats["time"])
+                for name, value in stats.items():
+                    if isinstance(value, (int, float)):
+                        search[name] = search.get(name, 0) + value
+            totals["searched_moves"][player] += len(moves)
+
+    @staticmethod
+    def CountStreak(longest, current, outcome):
+        if outcome == 0:
+            current[1] = current[2] = 0
+        else:
+            current[outcome] += 1
+            current[3 - outcome] = 0
+            longest[outcome] = max(longest[outcome], current[outcome])
+
+    def LongestStreaks(self, totals):
+        """
+        Longest streaks including games still waiting for an earlier game id, taken in id order.
+        """
+        longest = dict(totals["longest_streak"])
+        current = dict(totals["current_streak"])
+        for game_id in sorted(totals["pending"]):
+            self.CountStreak(longest, current, totals["pending"][game_id])
+        return longest
+
+    @staticmethod
+    def Percentile(values, percent):
+        """
+        Nearest-rank percentile of values, 0 when there are none.
+        """
+        if not values:
+            return 0
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def Latency(self, times):
+        return {"p50": self.Percentile(times, 50), "p95": self.Percentile(times, 95),
+                "p99": self.Percentile(times, 99), "Max": max(times, default=0)}
+
+    def Results(self):
+        return {budget: {"Player1_Wins": totals["wins"][1], "Player2_Wins": totals["wins"][2], "Draws": totals["wins"][0]}
+                for budget, totals in sorted(self.totals.items())}
+
+    def Metrics(self):
+        metrics = {}
+        for budget, totals in sorted(self.totals.items()):
+            games, wins, moves = totals["games"], totals["wins"], totals["moves"]
+            player_moves, player_time, tt = totals["player_moves"], totals["player_time"], totals["tt"]
+            longest_streak = self.LongestStreaks(totals)
+            metrics[budget] = {
+                "Games": games,
+                "Winning_Percentage": {
+                    "Player1": (wins[1] / games) * 100,
+                    "Player2": (wins[2] / games) * 100,
+                    "Draws": (wins[0] / games) * 100,
+                },
+                "Average_Moves": {
+                    "Player1": moves[1] / wins[1] if wins[1] > 0 else 0,
+                    "Player2": moves[2] / wins[2] if wins[2] > 0 else 0,
+                    "Draws": moves[0] / wins[0] if wins[0] > 0 else 0,
+                },
+                "Average_Time_Per_Move": {
+                    "Player1": player_time[1] / player_moves[1] if player_moves[1] > 0 else 0,
+                    "Player2": player_time[2] / player_moves[2] if player_moves[2] > 0 else 0,
+                },
+                "Total_Moves": {"Player1": player_moves[1], "Player2": player_moves[2]},
+                "Total_Time": {"Player1": player_time[1], "Player2": player_time[2]},
+                "Longest_Win_Streak": {
+                    "Player1": longest_streak[1],
+                    "Player2": longest_streak[2],
+                },
+                "Transposition_Table": {
+                    "Hits": tt.get("hits", 0),
+                    "Misses": tt.get("misses", 0),
+                    "Cutoffs": tt.get("cutoffs", 0),
+                    "Hit_Rate": tt.get("hits", 0) / tt["probes"] if tt.get("probes", 0) > 0 else 0,
+                },
+                "Move_Latency": {
+                    "Player1": self.Latency(totals["move_times"][1]),
+                    "Player2": self.Latency(totals["move_times"][2]),
+                },
+                "Search_Per_Move": {
+                    f"Player{player}": {name: value / totals["searched_moves"][player]
+                                        for name, value in totals["search"][player].items()}
+                    for player in (1, 2)
+                },
+            }
+        return metrics
+
+
+def PrintReport(results, metrics):
+    for budget, result in results.items():
+        print(f"\nResults for budget {budget}:")
+        print(f"Player1 Wins: {result['Player1_Wins']}")
+        print(f"Player2 Wins: {result['Player2_Wins']}")
+        print(f"Draws: {result['Draws']}")
+        print(f"Winning Percentage: {metrics[budget]['Winning_Percentage']}")
+        print(f"Average Moves: {metrics[budget]['Average_Moves']}")
+        print(f"Average Time Per Move: {metrics[budget]['Average_Time_Per_Move']}")
+        print(f"Longest Win Streak: {metrics[budget]['Longest_Win_Streak']}")
+        print(f"Transposition Table: {metrics[budget]['Transposition_Table']}")
+        print(f"Move Latency: {metrics[budget]['Move_Latency']}")
+        print(f"Search Per Move: {metrics[budget]['Search_Per_Move']}")
+
+
+def LogOptions(path):
+    """
+    Returns the distinct player2_options of the games in a log, in the order they first appear.
+    """
+    options = []
+    for record in ResultsLog(path).Records():
+        if record.get("player2_options", {}) not in options:
+            options.append(record.get("player2_options", {}))
+    return options
+
+
+def ReportFromLog(path, player2_options=None):
+    """
+    Rebuilds results and metrics from the games in a log file that were played with player2_options
+    (None or {} for the default Player2), returns (results, metrics). A game recorded more than once
+    is counted once.
+    """
+    wanted = player2_options or {}
+    aggregator = ResultsAggregator()
+    seen = set()
+    for record in ResultsLog(path).Records():
+        game = (record["budget"], record["game_id"])
+        if record.get("player2_options", {}) != wanted or game in seen:
+            continue
+        seen.add(game)
+        aggregator.Add(record)
+    return aggregator.Results(), aggregator.Metrics()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python results_log.py <results.jsonl>")
+        sys.exit(1)
+    for options in LogOptions(sys.argv[1]):
+        print(f"\nPlayer2 options: {options or 'default'}")
+        PrintReport(*ReportFromLog(sys.argv[1], options))
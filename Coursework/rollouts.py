@@ -0,0 +1,73 @@
+import random
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for batched rollouts
+    np = None
+
+
+def SeededGenerator():
+    """
+    Returns a numpy Generator seeded from the random module, so random.seed(...) makes batched
+    rollouts reproducible as well.
+    """
+    return np.random.default_rng(random.getrandbits(64))
+
+
+def BatchRollout(states, playouts=256, rng=None):
+    """
+    Plays `playouts` uniformly random games from each of states at once with NumPy arrays.
+    All games advance one ply per step: a random legal column is picked for every unfinished
+    game, the piece is dropped and only the lines through it are checked for a win.
+
+    :param states: A Connect4State or a list of them, all with the same board size.
+    :param playouts: Number of random games per state.
+    :param rng: numpy Generator to draw moves from, a new SeededGenerator when None.
+    :returns: Counts indexed by result: [draws, player 1 wins, player 2 wins]. An array of shape
+        (3,) for a single state, (len(states), 3) for a list.
+    """
+    if np is None:
+        raise ImportError("BatchRollout needs numpy, install it with: pip install numpy")
+    single = not isinstance(states, (list, tuple))
+    if single:
+        states = [states]
+    rng = rng if rng is not None else SeededGenerator()
+    width, height, connect = states[0].width, states[0].height, states[0].connect
+    margin = connect - 1  # Empty border so line checks never index outside the board
+
+    n = len(states) * playouts
+    start = np.array([state.board for state in states], dtype=np.int8)
+    boards = np.zeros((n, width + 2 * margin, height + 2 * margin), dtype=np.int8)
+    boards[:, margin:margin + width, margin:margin + height] = np.repeat(start, playouts, axis=0)
+    heights = np.repeat((start != 0).sum(axis=2), playouts, axis=0)
+    toMove = np.repeat(np.array([3 - state.playerJustMoved for state in states], dtype=np.int8), playouts)
+    winner = np.repeat(np.array([state.winner for state in states], dtype=np.int8), playouts)
+
+    steps = np.arange(1, connect)
+    directions = [(0, 1), (1, 0), (1, 1), (1, -1)]
+    games = np.nonzero((winner == 0) & (heights < height).any(axis=1))[0]
+    while games.size:
+        legal = heights[games] < height
+        choice = rng.random(legal.shape)
+        choice[~legal] = -1.0
+        col = choice.argmax(axis=1)
+        row = heights[games, col]
+        player = toMove[games]
+        boards[games, col + margin, row + margin] = player
+        heights[games, col] += 1
+
+        won = np.zeros(games.size, dtype=bool)
+        g, x, y, me = games[:, None], (col + margin)[:, None], (row + margin)[:, None], player[:, None]
+        for dx, dy in directions:
+            forward = boards[g, x + dx * steps, y + dy * steps] == me
+            backward = boards[g, x - dx * steps, y - dy * steps] == me
+            run = 1 + np.cumprod(forward, axis=1).sum(axis=1) + np.cumprod(backward, axis=1).sum(axis=1)
+            won |= run >= connect
+        winner[games[won]] = player[won]
+        toMove[games] = 3 - player
+        full = (heights[games] >= height).all(axis=1)
+        games = games[~won & ~full]
+
+    results = winner.reshape(len(states), playouts)
+    counts = np.stack([(results == 0).sum(axis=1), (results == 1).sum(axis=1), (results == 2).sum(axis=1)], axis=1)
+    return counts[0] if single else counts
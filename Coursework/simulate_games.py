@@ -1,21 +1,59 @@
+import argparse
+import random
 import time
-from multiprocessing import Pool
+from multiprocessing import Pool, util
 from Player1 import Player1
 from Player2 import Player2
-from game_logic import Connect4State
+from game_logic import BitboardConnect4State
+from results_log import ResultsLog, ResultsAggregator, PrintReport, ReportFromLog
 
 ''' 
 Run this file in order to run multiple games at once 
-In main add into budgets the number of computational budgets you want to test and
-num_games the number of games it should play per computational budget
+Pass --budgets with the computational budgets you want to test and --games with
+the number of games it should play per computational budget, for example:
+python simulate_games.py --budgets 100 500 --games 100 --log results.jsonl
 '''
-def simulate_single_game(args):
-    from game_logic import Connect4State
-    from Player1 import Player1
-    from Player2 import Player2
+_players = {}  # budget -> (Player1, Player2), kept by each worker process between games
+_player2_options = {}  # Extra Player2 arguments of this run, e.g. {"rave": 300, "tree": "node"}
+
+
+def init_worker(budgets, player2_options=None):
+    """
+    Pool initializer: builds the players for every budget once per worker process.
+    """
+    _player2_options.update(player2_options or {})
+    util.Finalize(None, close_players, exitpriority=10)  # When the worker exits
+    for budget in budgets:
+        get_players(budget)
+
 
-    budget, game_id = args
-    state = Connect4State()
+def get_players(budget):
+    """
+    Returns this process's players for budget, reset for a new game.
+    """
+    if budget not in _players:
+        _players[budget] = (Player1(computational_budget=budget), Player2(computational_budget=budget, **_player2_options))
+    player1, player2 = _players[budget]
+    player1.Reset()
+    player2.Reset()
+    return player1, player2
+
+
+def close_players():
+    for _, player2 in _players.values():
+        player2.Close()
+    _players.clear()
+
+
+def simulate_single_game(args):
+    """
+    Plays one game. args is (budget, game_id) or (budget, game_id, seed), the random generator
+    is seeded from all three so a game plays out the same whichever worker runs it.
+    """
+    budget, game_id = args[:2]
+    seed = args[2] if len(args) > 2 else 0
+    random.seed(f"{seed}-{budget}-{game_id}")
+    state = BitboardConnect4State()
 
     # Alternate starting player
     if game_id % 2 == 0:
@@ -23,21 +61,23 @@ def simulate_single_game(args):
     else:
         state.playerJustMoved = 1  # Player 2 starts
 
-    player1 = Player1(computational_budget=budget)
-    player2 = Player2(computational_budget=budget)
+    player1, player2 = get_players(budget)
 
-    player_time = {1: 0, 2: 0}
+    player_time = [0, 0]
+    player_moves = [0, 0]
+    move_stats = [[], []]  # Per player, the search statistics of every move without the root visits
     move_count = 0
 
     while not state.IsGameOver():
+        mover = 3 - state.playerJustMoved
         start_time = time.time()
-        if state.playerJustMoved == 1:
-            move = player2.choose_move(state)
-        else:
-            move = player1.choose_move(state)
+        player = player2 if mover == 2 else player1
+        move = player.choose_move(state)
         end_time = time.time()
+        move_stats[mover - 1].append({name: value for name, value in player.move_stats.items() if name != "root_visits"})
 
-        player_time[state.playerJustMoved] += (end_time - start_time)
+        player_time[mover - 1] += (end_time - start_time)
+        player_moves[mover - 1] += 1
         state.DoMove(move)
         move_count += 1
 
@@ -46,88 +86,99 @@ def simulate_single_game(args):
     if winner not in [1, 2]:
         winner = 0  # Treat unexpected outcomes as a draw
 
-    return winner, move_count, player_time
-
-def simulate_games_parallel(num_games, budgets):
-    results = {budget: {"Player1_Wins": 0, "Player2_Wins": 0, "Draws": 0} for budget in budgets}
-    total_moves = {budget: {1: 0, 2: 0, "Draws": 0} for budget in budgets}
-    win_counts = {budget: {1: 0, 2: 0, 0: 0} for budget in budgets}  # Include 0 for draws
-    total_time = {budget: {1: 0, 2: 0} for budget in budgets}
-    win_streaks = {budget: {1: 0, 2: 0} for budget in budgets}
-    current_streak = {budget: {1: 0, 2: 0} for budget in budgets}
-
-    for budget in budgets:
-        print(f"Simulating games for budget: {budget}")
-        completed_games = 0
-        outcomes = []
-
-        with Pool() as pool:
-            for outcome in pool.imap(simulate_single_game, [(budget, i) for i in range(num_games)]):
-                outcomes.append(outcome)
+    tt_stats = dict(player1.transposition_table.stats) if player1.transposition_table is not None else {}
+
+    return {
+        "budget": budget,
+        "game_id": game_id,
+        "winner": winner,
+        "moves": move_count,
+        "player_moves": player_moves,
+        "player_time": player_time,
+        "tt": tt_stats,
+        "move_stats": move_stats,
+        "player2_options": dict(_player2_options),
+    }
+
+def simulate_games_parallel(num_games, budgets, log_path=None, processes=None, chunksize=4, seed=0, player2_options=None):
+    """
+    Plays num_games games per budget and returns (results, metrics).
+    player2_options are extra Player2 arguments, so variants such as RAVE or decisive rollouts
+    can be measured against the same Player1; a log only resumes games played with the same options.
+    All budgets share one pool of worker processes that keep their players between games, and
+    games are handed out chunksize at a time in whatever order they finish.
+    With log_path every finished game is appended to that JSONL log straight away, and games
+    already in the log are counted without being played again, so an interrupted run resumes.
+    """
+    aggregator = ResultsAggregator()
+    log = ResultsLog(log_path) if log_path is not None else None
+    recorded = set()
+    if log is not None:
+        for record in log.Records():
+            if record["budget"] in budgets and record["game_id"] < num_games \
+                    and record.get("player2_options", {}) == (player2_options or {}) \
+                    and (record["budget"], record["game_id"]) not in recorded:
+                recorded.add((record["budget"], record["game_id"]))
+                aggregator.Add(record)
+        if recorded:
+            print(f"Resuming: {len(recorded)}/{num_games * len(budgets)} games already in {log_path}")
+
+    tasks = [(budget, i, seed) for budget in budgets for i in range(num_games) if (budget, i) not in recorded]
+    print(f"Simulating {len(tasks)} games for budgets: {budgets}")
+    completed_games = 0
+    start_time = time.time()
+    try:
+        with Pool(processes, initializer=init_worker, initargs=(budgets, player2_options)) as pool:
+            for record in pool.imap_unordered(simulate_single_game, tasks, chunksize):
+                if log is not None:
+                    log.Append(record)
+                aggregator.Add(record)
                 completed_games += 1
-                if completed_games % 10 == 0 or completed_games == num_games:  # Update progress every 10 games
-                    print(f"Games completed: {completed_games}/{num_games}")
-            for outcome, moves, player_time in outcomes:
-                if outcome not in [1, 2, 0]:  # Handle unexpected outcomes
-                    print(f"Unexpected outcome: {outcome}. Defaulting to Draw.")
-                    outcome = 0
-
-                if outcome == 1:
-                    results[budget]["Player1_Wins"] += 1
-                    total_moves[budget][1] += moves
-                    total_time[budget][1] += player_time[1]
-                    current_streak[budget][1] += 1
-                    win_streaks[budget][1] = max(win_streaks[budget][1], current_streak[budget][1])
-                    current_streak[budget][2] = 0
-                elif outcome == 2:
-                    results[budget]["Player2_Wins"] += 1
-                    total_moves[budget][2] += moves
-                    total_time[budget][2] += player_time[2]
-                    current_streak[budget][2] += 1
-                    win_streaks[budget][2] = max(win_streaks[budget][2], current_streak[budget][2])
-                    current_streak[budget][1] = 0
-                else:  # Draw
-                    results[budget]["Draws"] += 1
-                    total_moves[budget]["Draws"] += moves
-                    current_streak[budget] = {1: 0, 2: 0}
-                win_counts[budget][outcome] += 1
-
-    metrics = {}
-    for budget in budgets:
-        metrics[budget] = {
-            "Winning_Percentage": {
-                "Player1": (results[budget]["Player1_Wins"] / num_games) * 100,
-                "Player2": (results[budget]["Player2_Wins"] / num_games) * 100,
-                "Draws": (results[budget]["Draws"] / num_games) * 100,
-            },
-            "Average_Moves": {
-                "Player1": total_moves[budget][1] / win_counts[budget][1] if win_counts[budget][1] > 0 else 0,
-                "Player2": total_moves[budget][2] / win_counts[budget][2] if win_counts[budget][2] > 0 else 0,
-                "Draws": total_moves[budget]["Draws"] / win_counts[budget][0] if win_counts[budget][0] > 0 else 0,
-            },
-            "Average_Time_Per_Move": {
-                "Player1": total_time[budget][1] / results[budget]["Player1_Wins"] if results[budget]["Player1_Wins"] > 0 else 0,
-                "Player2": total_time[budget][2] / results[budget]["Player2_Wins"] if results[budget]["Player2_Wins"] > 0 else 0,
-            },
-            "Longest_Win_Streak": {
-                "Player1": win_streaks[budget][1],
-                "Player2": win_streaks[budget][2],
-            },
-        }
-    return results, metrics
+                if completed_games % 10 == 0 or completed_games == len(tasks):  # Update progress every 10 games
+                    rate = completed_games / (time.time() - start_time)
+                    print(f"Games completed: {completed_games}/{len(tasks)} ({rate:.2f} games/s)")
+            pool.close()  # Let the workers exit normally so they close their players
+            pool.join()
+    finally:
+        if log is not None:
+            log.Close()
+
+    return aggregator.Results(), aggregator.Metrics()
 
 
 if __name__ == "__main__":
-    budgets = [100,500,1000,10000]  # You can add more budgets like 500, 1000, 10000
-    num_games = 1000  # Adjust the number of games as needed
-    results, metrics = simulate_games_parallel(num_games, budgets)
-
-    for budget, result in results.items():
-        print(f"\nResults for budget {budget}:")
-        print(f"Player1 Wins: {result['Player1_Wins']}")
-        print(f"Player2 Wins: {result['Player2_Wins']}")
-        print(f"Draws: {result['Draws']}")
-        print(f"Winning Percentage: {metrics[budget]['Winning_Percentage']}")
-        print(f"Average Moves: {metrics[budget]['Average_Moves']}")
-        print(f"Average Time Per Move: {metrics[budget]['Average_Time_Per_Move']}")
-        print(f"Longest Win Streak: {metrics[budget]['Longest_Win_Streak']}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Play Player1 against Player2 at several budgets.")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[100, 500, 1000, 10000])
+    parser.add_argument("--games", type=int, default=1000, help="games per budget")
+    parser.add_argument("--log", help="append every game to this JSONL log and resume from it")
+    parser.add_argument("--report", metavar="LOG",
+                        help="only print the report for an existing log, for the games played with the Player2 options given")
+    parser.add_argument("--processes", type=int, help="worker processes, one per core by default")
+    parser.add_argument("--chunksize", type=int, default=4, help="games handed to a worker at a time")
+    parser.add_argument("--seed", type=int, default=0, help="base seed, every game is seeded from it and its id")
+    parser.add_argument("--rave", type=float, default=0, help="Player2 RAVE equivalence parameter (uses the Node tree)")
+    parser.add_argument("--decisive-rollouts", action="store_true", help="Player2 rollouts take wins and block losses")
+    parser.add_argument("--early-stop", action="store_true", help="Player2 stops once its most visited move can not be overtaken")
+    parser.add_argument("--carry-budget", action="store_true", help="Player2 passes unused iterations on to later moves")
+    parser.add_argument("--time-limit", type=float, help="Player2 seconds per move on top of the iteration budget")
+    args = parser.parse_args()
+
+    player2_options = {}
+    if args.rave:
+        player2_options.update(rave=args.rave, tree="node")
+    if args.decisive_rollouts:
+        player2_options["decisive_rollouts"] = True
+    if args.early_stop:
+        player2_options["early_stop"] = True
+    if args.carry_budget:
+        player2_options["carry_budget"] = True
+    if args.time_limit is not None:
+        player2_options["time_limit"] = args.time_limit
+
+    if args.report:
+        results, metrics = ReportFromLog(args.report, player2_options)
+    else:
+        results, metrics = simulate_games_parallel(args.games, args.budgets, log_path=args.log, processes=args.processes,
+                                                   chunksize=args.chunksize, seed=args.seed,
+                                                   player2_options=player2_options)
+    PrintReport(results, metrics)
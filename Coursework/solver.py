@@ -0,0 +1,158 @@
+class Solver:
+    """
+    Exact Connect 4 solver for positions with few empty cells: negamax with alpha-beta and
+    null-window (MTD style) searches, working on two bitmasks the way BitboardConnect4State does.
+
+    Scores are from the point of view of the side to move. A positive score is a win, and the
+    sooner the win the higher the score. A negative score is a loss and 0 is a draw.
+    """
+
+    def __init__(self, max_empty=12, tt_limit=1 << 20):
+        """
+        :param max_empty: Largest number of empty cells CanSolve accepts.
+        :param tt_limit: The transposition table is cleared when it grows past this many entries.
+        """
+        self.max_empty = max_empty
+        self.tt_limit = tt_limit
+        self.table = {}  # Position key -> upper bound of its score
+        self.nodes = 0
+        self.layout = None
+
+    def SetLayout(self, width, height, connect):
+        if self.layout == (width, height, connect):
+            return
+        self.layout = (width, height, connect)
+        self.width, self.height, self.connect = width, height, connect
+        self.cells = width * height
+        stride = height + 1
+        self.bottom = [1 << (col * stride) for col in range(width)]
+        self.top = [1 << (col * stride + height - 1) for col in range(width)]
+        self.column = [((1 << height) - 1) << (col * stride) for col in range(width)]
+        self.shifts = (1, stride, stride - 1, stride + 1)
+        self.order = sorted(range(width), key=lambda col: abs(col - width // 2))  # Centre columns first
+        self.table = {}
+
+    def CanSolve(self, state):
+        return state.winner == 0 and self.EmptyCells(state) <= self.max_empty
+
+    def EmptyCells(self, state):
+        return sum(col.count(0) for col in state.board)
+
+    def Bitboards(self, state):
+        """
+        Returns (current, mask, moves): the pieces of the side to move, all pieces and the number of pieces.
+        """
+        self.SetLayout(state.width, state.height, state.connect)
+        toMove = 3 - state.playerJustMoved
+        current = mask = moves = 0
+        for col in range(state.width):
+            for row in range(state.height):
+                cell = state.board[col][row]
+                if cell != 0:
+                    bit = 1 << (col * (state.height + 1) + row)
+                    mask |= bit
+                    moves += 1
+                    if cell == toMove:
+                        current |= bit
+        return current, mask, moves
+
+    def IsWin(self, pieces):
+        for shift in self.shifts:
+            m = pieces
+            run = 1
+            while run * 2 <= self.connect:
+                m &= m >> (shift * run)
+                run *= 2
+            if run < self.connect:
+                m &= m >> (shift * (self.connect - run))
+            if m:
+                return True
+        return False
+
+    def Negamax(self, current, mask, moves, alpha, beta):
+        self.nodes += 1
+        if moves == self.cells:
+            return 0
+        for col in self.order:
+            if not mask & self.top[col] and self.IsWin(current | ((mask + self.bottom[col]) & self.column[col])):
+                return (self.cells + 1 - moves) // 2
+
+        best = (self.cells - 1 - moves) // 2  # Can not win before our next move
+        key = current + mask
+        bound = self.table.get(key)
+        if bound is not None and bound < best:
+            best = bound
+        if beta > best:
+            beta = best
+            if alpha >= beta:
+                return beta
+
+        for col in self.order:
+            if not mask & self.top[col]:
+                newMask = mask | (mask + self.bottom[col])
+                score = -self.Negamax(current ^ mask, newMask, moves + 1, -beta, -alpha)
+                if score >= beta:
+                    return score
+                if score > alpha:
+                    alpha = score
+        if len(self.table) >= self.tt_limit:
+            self.table.clear()
+        self.table[key] = alpha
+        return alpha
+
+    def Score(self, current, mask, moves):
+        """
+        Exact score of a position found by narrowing a window with null-window searches.
+        """
+        low = -((self.cells - moves) // 2)
+        high = (self.cells + 1 - moves) // 2
+        while low < high:
+            middle = low + (high - low) // 2
+            # Search closer to 0 first, most positions are decided by a small margin
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+            result = self.Negamax(current, mask, moves, middle, middle + 1)
+            if result <= middle:
+                high = result
+            else:
+                low = result
+        return low
+
+    def Result(self, score, moves):
+        """
+        Converts a score into (result, distance): 1 win, 0 draw or -1 loss for the side to move,
+        and the number of plies until the game ends with best play.
+        """
+        if score > 0:
+            return 1, 2 * ((self.cells + 1 - moves) // 2 - score) + 1
+        if score < 0:
+            return -1, 2 * ((self.cells - moves) // 2 + score + 1)
+        return 0, self.cells - moves
+
+    def Solve(self, state):
+        """
+        Returns (result, distance) of state for the side to move, see Result.
+        """
+        current, mask, moves = self.Bitboards(state)
+        return self.Result(self.Score(current, mask, moves), moves)
+
+    def BestMove(self, state):
+        """
+        Returns (move, result, distance) for the best move in state. Among moves with the same
+        result wins are taken as fast as possible and losses put off as long as possible.
+        """
+        current, mask, moves = self.Bitboards(state)
+        bestMove, bestScore = None, None
+        for col in self.order:
+            if mask & self.top[col]:
+                continue
+            played = (mask + self.bottom[col]) & self.column[col]
+            if self.IsWin(current | played):
+                score = (self.cells + 1 - moves) // 2
+            else:
+                score = -self.Score(current ^ mask, mask | played, moves + 1)
+            if bestScore is None or score > bestScore:
+                bestMove, bestScore = col, score
+        return (bestMove,) + self.Result(bestScore, moves)
@@ -0,0 +1,302 @@
+import argparse
+import ast
+import math
+import random
+import time
+from multiprocessing import Pool, util
+from Player1 import Player1
+from Player2 import Player2
+from game_logic import BitboardConnect4State
+
+'''
+Tournament between any number of player configurations, either round-robin (every pair plays)
+or gauntlet (the first engine plays every other one). Engines are given as NAME=CLASS:ARGS where
+ARGS are keyword arguments of the player class, for example:
+python tournament.py --engine mcts1k=Player2:computational_budget=1000 \
+    --engine mcts1k_c1=Player2:computational_budget=1000,exploration_factor_ucb1=1.0 \
+    --engine minimax=Player1:computational_budget=1000 --mode round-robin --max-games 400
+
+Every pairing plays games in pairs with colours swapped and stops early once a sequential
+probability ratio test (SPRT) decides between "the first engine is elo1 stronger" (H1) and
+"it is at most elo0 stronger" (H0). Ratings are fitted to all games with a Bradley-Terry model,
+the first engine anchored at 0 Elo.
+'''
+
+PLAYERS = {"Player1": Player1, "Player2": Player2}
+_engines = {}  # name -> player, kept by each worker process between games
+
+
+def ParseEngine(spec):
+    """
+    Parses NAME=CLASS:key=value,key=value into (name, class name, kwargs).
+    Values are Python literals, anything else is taken as a string.
+    """
+    name, _, definition = spec.partition("=")
+    kind, _, arguments = definition.partition(":")
+    if not name or kind not in PLAYERS:
+        raise ValueError(f"Bad engine {spec!r}, expected NAME=CLASS:ARGS with CLASS one of {sorted(PLAYERS)}")
+    kwargs = {}
+    for argument in filter(None, arguments.split(",")):
+        key, _, value = argument.partition("=")
+        try:
+            kwargs[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            kwargs[key] = value
+    return name, kind, kwargs
+
+
+def get_engine(engine):
+    """
+    Returns this process's player for engine (name, class name, kwargs), reset for a new game.
+    """
+    name, kind, kwargs = engine
+    if not _engines:
+        util.Finalize(None, close_engines, exitpriority=10)  # When the worker exits
+    if name not in _engines:
+        _engines[name] = PLAYERS[kind](**kwargs)
+    player = _engines[name]
+    player.Reset()
+    return player
+
+
+def close_engines():
+    """
+    Closes this process's players (shutting down root parallel pools) and forgets them.
+    """
+    for player in _engines.values():
+        if hasattr(player, "Close"):
+            player.Close()
+    _engines.clear()
+
+
+def play_tournament_game(args):
+    """
+    Plays one game of a pairing. Engine A plays the first move in even games, engine B in odd games.
+    Returns (pairing index, game id, score of engine A: 1, 0.5 or 0).
+    """
+    pairing, game_id, engineA, engineB, seed = args
+    random.seed(f"{seed}-{pairing}-{game_id}")
+    state = BitboardConnect4State()
+    pieceA = 1 if game_id % 2 == 0 else 2
+    state.playerJustMoved = 2  # Piece 1 moves first
+    players = {pieceA: get_engine(engineA), 3 - pieceA: get_engine(engineB)}
+    while not state.IsGameOver():
+        state.DoMove(players[3 - state.playerJustMoved].choose_move(state))
+    if state.winner == pieceA:
+        return pairing, game_id, 1
+    if state.winner == 3 - pieceA:
+        return pairing, game_id, 0
+    return pairing, game_id, 0.5
+
+
+def ExpectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def EloFromScore(score):
+    score = min(max(score, 1e-3), 1 - 1e-3)
+    return -400 * math.log10(1 / score - 1)
+
+
+class Pairing:
+    """
+    Results of one engine against another, scores from engine A's point of view.
+    """
+
+    def __init__(self, engineA, engineB):
+        self.engineA = engineA
+        self.engineB = engineB
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.decision = None  # "H1" or "H0" once the SPRT stopped the pairing
+
+    def Add(self, score):
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    def Games(self):
+        return self.wins + self.draws + self.losses
+
+    def Score(self):
+        return (self.wins + 0.5 * self.draws) / self.Games()
+
+    def Variance(self):
+        """
+        Variance of the score of a single game.
+        """
+        mean = self.Score()
+        return (self.wins * (1 - mean) ** 2 + self.draws * (0.5 - mean) ** 2 + self.losses * mean ** 2) / self.Games()
+
+    def Elo(self, z=1.96):
+        """
+        Returns (elo, low, high): the Elo difference of A over B and its confidence interval.
+        """
+        games = self.Games()
+        score = min(max(self.Score(), 0.5 / games), 1 - 0.5 / games)  # Finite Elo for a perfect score
+        margin = z * math.sqrt(self.Variance() / games)
+        return EloFromScore(score), EloFromScore(score - margin), EloFromScore(score + margin)
+
+    def LLR(self, elo0, elo1):
+        """
+        Log likelihood ratio of H1 (A is elo1 stronger) against H0 (A is elo0 stronger), using
+        the normal approximation of the score distribution.
+        """
+        s0, s1 = ExpectedScore(elo0), ExpectedScore(elo1)
+        variance = max(self.Variance(), 1e-3)  # A perfect score so far would otherwise be decisive at once
+        return (s1 - s0) * (2 * self.Score() - s0 - s1) * self.Games() / (2 * variance)
+
+    def SPRT(self, elo0, elo1, alpha, beta, min_games):
+        """
+        Returns "H1", "H0" or None while the test is still undecided.
+        """
+        if self.Games() < min_games:
+            return None
+        llr = self.LLR(elo0, elo1)
+        if llr >= math.log((1 - beta) / alpha):
+            return "H1"
+        if llr <= math.log(beta / (1 - alpha)):
+            return "H0"
+        return None
+
+
+def Solve(matrix, vector):
+    """
+    Solves matrix * x = vector with Gaussian elimination, the matrix being small and non-singular.
+    """
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        for r in range(n):
+            if r != col and rows[col][col] != 0:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] if rows[i][i] != 0 else 0 for i in range(n)]
+
+
+def FitRatings(names, pairings, iterations=50, z=1.96):
+    """
+    Maximum likelihood Bradley-Terry ratings for all engines from the pairing results, with the first
+    engine anchored at 0. Returns {name: (elo, margin)} where margin is the half width of the
+    confidence interval taken from the Fisher information.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    c = math.log(10) / 400
+    ratings = [0.0] * len(names)
+    fisher = None
+    for _ in range(iterations):
+        gradient = [0.0] * len(names)
+        fisher = [[0.0] * len(names) for _ in names]
+        for pairing in pairings:
+            if pairing.Games() == 0:
+                continue
+            a, b = index[pairing.engineA], index[pairing.engineB]
+            # Clamp the observed score so an engine that won every game still gets a finite rating
+            games = pairing.Games()
+            score = min(max(pairing.Score(), 0.5 / games), 1 - 0.5 / games) * games
+            expected = ExpectedScore(ratings[a] - ratings[b])
+            gradient[a] += c * (score - games * expected)
+            gradient[b] -= c * (score - games * expected)
+            information = c * c * games * expected * (1 - expected)
+            fisher[a][a] += information
+            fisher[b][b] += information
+            fisher[a][b] -= information
+            fisher[b][a] -= information
+        # Newton step on every rating but the anchor
+        step = Solve([row[1:] for row in fisher[1:]], gradient[1:])
+        for i, delta in enumerate(step, start=1):
+            ratings[i] += max(-400, min(400, delta))
+        if max((abs(delta) for delta in step), default=0) < 1e-6:
+            break
+
+    reduced = [row[1:] for row in fisher[1:]]
+    margins = [0.0]
+    for i in range(len(reduced)):
+        unit = [1.0 if j == i else 0.0 for j in range(len(reduced))]
+        variance = Solve(reduced, unit)[i]
+        margins.append(z * math.sqrt(variance) if variance > 0 else float('inf'))
+    return {name: (ratings[i], margins[i]) for i, name in enumerate(names)}
+
+
+def run_tournament(engines, mode="round-robin", max_games=400, batch=10, elo0=0, elo1=20, alpha=0.05, beta=0.05,
+                   min_games=20, processes=None, seed=0):
+    """
+    Plays the tournament and returns (pairings, ratings).
+
+    :param engines: [(name, class name, kwargs)] as returned by ParseEngine.
+    :param mode: "round-robin" or "gauntlet" (the first engine against each of the others).
+    :param max_games: Games per pairing when the SPRT does not stop it earlier.
+    :param batch: Games per pairing handed to the pool before the SPRT is checked again, kept even
+        so colours stay balanced.
+    :param elo0, elo1, alpha, beta: SPRT hypotheses and error rates.
+    :param min_games: Games a pairing plays before the SPRT may stop it.
+    """
+    names = [engine[0] for engine in engines]
+    if mode == "gauntlet":
+        matches = [(engines[0], engine) for engine in engines[1:]]
+    else:
+        matches = [(engines[i], engines[j]) for i in range(len(engines)) for j in range(i + 1, len(engines))]
+    pairings = [Pairing(a[0], b[0]) for a, b in matches]
+    batch += batch % 2
+
+    start_time = time.time()
+    played = 0
+    with Pool(processes) as pool:
+        while True:
+            active = [i for i, pairing in enumerate(pairings) if pairing.decision is None and pairing.Games() < max_games]
+            if not active:
+                break
+            tasks = [(i, game_id, matches[i][0], matches[i][1], seed) for i in active
+                     for game_id in range(pairings[i].Games(), min(pairings[i].Games() + batch, max_games))]
+            for i, game_id, score in pool.imap_unordered(play_tournament_game, tasks):
+                pairings[i].Add(score)
+                played += 1
+            for i in active:
+                pairings[i].decision = pairings[i].SPRT(elo0, elo1, alpha, beta, min_games)
+            print(f"Games played: {played} ({played / (time.time() - start_time):.2f} games/s), "
+                  f"pairings still running: {sum(1 for i in active if pairings[i].decision is None)}")
+        pool.close()  # Let the workers exit normally so they close their engines
+        pool.join()
+
+    return pairings, FitRatings(names, pairings)
+
+
+def PrintTournament(pairings, ratings):
+    print("\nPairings (Elo of the first engine over the second, 95% interval):")
+    for pairing in pairings:
+        elo, low, high = pairing.Elo()
+        decision = {"H1": "stronger", "H0": "not stronger", None: "undecided"}[pairing.decision]
+        print(f"{pairing.engineA} vs {pairing.engineB}: +{pairing.wins} ={pairing.draws} -{pairing.losses} "
+              f"({pairing.Games()} games)  Elo {elo:+.0f} [{low:+.0f}, {high:+.0f}]  SPRT: {decision}")
+    print("\nRatings:")
+    for name, (elo, margin) in sorted(ratings.items(), key=lambda item: -item[1][0]):
+        print(f"{name:20} {elo:+7.0f} +/- {margin:.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a tournament between Connect 4 player configurations.")
+    parser.add_argument("--engine", action="append", required=True, metavar="NAME=CLASS:ARGS",
+                        help="player configuration, e.g. mcts=Player2:computational_budget=1000 (give at least two)")
+    parser.add_argument("--mode", choices=["round-robin", "gauntlet"], default="round-robin")
+    parser.add_argument("--max-games", type=int, default=400, help="games per pairing if the SPRT does not stop it")
+    parser.add_argument("--batch", type=int, default=10, help="games per pairing between SPRT checks")
+    parser.add_argument("--elo0", type=float, default=0, help="SPRT null hypothesis Elo difference")
+    parser.add_argument("--elo1", type=float, default=20, help="SPRT alternative hypothesis Elo difference")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--min-games", type=int, default=20, help="games before the SPRT may stop a pairing")
+    parser.add_argument("--processes", type=int, help="worker processes, one per core by default")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engines = [ParseEngine(spec) for spec in args.engine]
+    if len(engines) < 2 or len({engine[0] for engine in engines}) != len(engines):
+        parser.error("give at least two engines with different names")
+    PrintTournament(*run_tournament(engines, args.mode, args.max_games, args.batch, args.elo0, args.elo1,
+                                    args.alpha, args.beta, args.min_games, args.processes, args.seed))
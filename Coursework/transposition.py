@@ -0,0 +1,50 @@
+EXACT, LOWER, UPPER = 0, 1, 2  # What the stored score is: the exact value or a bound on it
+
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of searched positions, keyed by the Zobrist key of the state.
+    Each slot holds one entry (key, depth, flag, score, move, generation) so memory never grows.
+    A slot is overwritten when it is empty, holds the same position, was written during an
+    earlier search, or was searched less deeply than the new entry.
+    """
+
+    def __init__(self, size=1 << 16):
+        """
+        :param size: Number of slots in the table.
+        """
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.stats = {"probes": 0, "hits": 0, "misses": 0, "cutoffs": 0, "stores": 0, "overwrites": 0}
+
+    def NewSearch(self):
+        """
+        Starts a new search, entries from earlier searches become the first to be replaced.
+        """
+        self.generation += 1
+
+    def Probe(self, key):
+        """
+        Looks up key and returns (depth, flag, score, move) or None when the position is not stored.
+        """
+        self.stats["probes"] += 1
+        entry = self.slots[key % self.size]
+        if entry is None or entry[0] != key:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[1:5]
+
+    def Store(self, key, depth, flag, score, move):
+        index = key % self.size
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return  # Keep the deeper result of the current search
+        if entry is not None and entry[0] != key:
+            self.stats["overwrites"] += 1
+        self.slots[index] = (key, depth, flag, score, move, self.generation)
+        self.stats["stores"] += 1
+
+    def HitRate(self):
+        return self.stats["hits"] / self.stats["probes"] if self.stats["probes"] > 0 else 0